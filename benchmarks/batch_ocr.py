@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import time
+
+import rich
+
+from benchmarks import worksheets
+from pdf_worksheet_organizer import organizer, questions
+
+# run from the repo root: python -m benchmarks.batch_ocr (needs tesseract)
+
+
+def main() -> None:
+    for page_count in (5, 20):
+        pdf_bytes = worksheets.image_worksheet(page_count=page_count)
+        pike_pdf, mu_pdf, _ = organizer.open_pdf(pdf_bytes)
+        pdf_file = organizer.parse_pdf(pike_pdf, mu_pdf)
+        image_count = sum(len(page.images) for page in pdf_file.pages)
+
+        rich.print(f"[bold]{page_count} pages, {image_count} images[/bold]")
+
+        found_numbers: dict[bool, list[int]] = {}
+        for batch_ocr in (False, True):
+            start = time.perf_counter()
+            numbered_pdf_file = questions.parse_numbered_pdf(pdf_file, batch_ocr=batch_ocr)
+            elapsed = time.perf_counter() - start
+
+            found_numbers[batch_ocr] = [el.number for page in numbered_pdf_file.pages for el in page.elements]
+            mode = "batched" if batch_ocr else "per image"
+            rich.print(
+                f"{mode:>10}: {elapsed:.2f}s, {image_count / elapsed:.1f} images/s, "
+                f"{numbered_pdf_file.questions_count} questions found"
+            )
+
+        if found_numbers[False] != found_numbers[True]:
+            rich.print("[yellow]batched and per image ocr found different question numbers[/yellow]")
+
+
+if __name__ == "__main__":
+    main()
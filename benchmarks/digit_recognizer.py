@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import time
+import typing as t
+
+import rich
+import pytesseract
+
+from benchmarks import worksheets
+from pdf_worksheet_organizer import digits, organizer, questions
+
+# run from the repo root: python -m benchmarks.digit_recognizer (needs tesseract and numpy)
+
+# (width, height) of the generated question images -- the font size is a fifth of the height
+IMAGE_SIZES = [(600, 160), (300, 80), (600, 60)]
+
+# what's drawn on the images: numbered questions, questions that start with a bare number (so have no
+# question number at all), and numbered questions below a header line that starts with digit-like ink
+IMAGE_KINDS: dict[str, dict[str, t.Any]] = {
+    "numbered": {},
+    "bare number": {"numbered": False},
+    "below a header": {"header": "1I"},
+}
+
+
+def main() -> None:
+    for size in IMAGE_SIZES:
+        for kind, image_options in IMAGE_KINDS.items():
+            numbers = range(1, 121)
+            pil_images = [worksheets.question_image(number, size=size, **image_options) for number in numbers]
+            expected_words = [f"{number}." if image_options.get("numbered", True) else None for number in numbers]
+
+            recognizer = digits.DigitRecognizer({})
+
+            start = time.perf_counter()
+            recognitions = [recognizer.recognize(pil_image) for pil_image in pil_images]
+            recognizer_elapsed = time.perf_counter() - start
+
+            # only confident recognitions skip tesseract, so those are the ones that have to be right
+            confident = [
+                (recognition, word)
+                for recognition, word in zip(recognitions, expected_words)
+                if recognition.confident
+            ]
+            correct = sum(
+                bool(recognition.question_number and recognition.question_number[0] == word)
+                for recognition, word in confident
+            )
+
+            start = time.perf_counter()
+            tesseract_words = [find_word_with_tesseract(pil_image) for pil_image in pil_images]
+            tesseract_elapsed = time.perf_counter() - start
+            tesseract_correct = sum(found == word for found, word in zip(tesseract_words, expected_words))
+
+            rich.print(f"[bold]{len(pil_images)} {kind} images of {size[0]}x{size[1]}[/bold]")
+            rich.print(
+                f"recognizer: {recognizer_elapsed:.2f}s, {len(confident)} confident ({correct} correct), "
+                f"{len(pil_images) - len(confident)} left to tesseract"
+            )
+            rich.print(f" tesseract: {tesseract_elapsed:.2f}s, {tesseract_correct} correct")
+
+    # end to end, where the templates come from the document's own (embedded) font
+    pdf_bytes = worksheets.mixed_worksheet(page_count=20)
+    for digit_recognizer in (False, True):
+        start = time.perf_counter()
+        question_map = organizer.detect_questions(pdf_bytes, digit_recognizer=digit_recognizer)
+        elapsed = time.perf_counter() - start
+
+        mode = "recognizer" if digit_recognizer else "tesseract"
+        questions_count = question_map["questions_count"]
+        rich.print(f"{mode:>10}: mixed worksheet detected in {elapsed:.2f}s, {questions_count} questions")
+
+
+def find_word_with_tesseract(pil_image: t.Any) -> str | None:
+    image_data = pytesseract.image_to_data(pil_image, lang="eng", output_type=pytesseract.Output.DICT)
+    question_number = questions.find_question_number(image_data)
+    return question_number[0] if question_number else None
+
+
+if __name__ == "__main__":
+    main()
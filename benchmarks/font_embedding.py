@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import time
+
+import rich
+import fitz as pymupdf
+
+from benchmarks import worksheets
+from pdf_worksheet_organizer import organizer, pdfio
+
+# run from the repo root: python -m benchmarks.font_embedding
+
+
+def count_embedded_fonts(pdf_bytes: bytes) -> int:
+    mu_pdf = pymupdf.Document(stream=pdf_bytes)
+    font_xrefs = {
+        mu_font[0]
+        for page_num in range(mu_pdf.page_count)
+        for mu_font in mu_pdf.get_page_fonts(page_num, full=True)
+        if mu_font[1] != "n/a"
+    }
+    return len(font_xrefs)
+
+
+def main() -> None:
+    inputs = {
+        "helvetica (50 pages)": worksheets.text_worksheet(page_count=50),
+        "embedded font (50 pages)": worksheets.text_worksheet(page_count=50, embed_font=True),
+        # needs tesseract
+        "text & images (10 pages)": worksheets.mixed_worksheet(page_count=10),
+    }
+
+    for name, pdf_bytes in inputs.items():
+        rich.print(f"[bold]{name}: {len(pdf_bytes):,} bytes in[/bold]")
+
+        for profile in pdfio.SAVE_PROFILES:
+            start = time.perf_counter()
+            final_pdf, _ = organizer.reorganize(pdf_bytes, add_legend=False)
+            renumber_elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            output_bytes = pdfio.save_pdf(final_pdf, profile=profile)
+            save_elapsed = time.perf_counter() - start
+
+            assert output_bytes is not None
+            rich.print(
+                f"{profile:>10}: {len(output_bytes):>10,} bytes, {count_embedded_fonts(output_bytes)} embedded fonts, "
+                f"renumber {renumber_elapsed * 1000:.0f}ms, save {save_elapsed * 1000:.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import os
+import time
+
+import rich
+
+from benchmarks import worksheets
+from pdf_worksheet_organizer import organizer, questions, renumber
+
+# run from the repo root: python -m benchmarks.image_renumbering (needs tesseract)
+
+
+def main() -> None:
+    rich.print(f"[bold]{os.cpu_count()} cpu cores[/bold]")
+
+    for page_count in (10, 40):
+        pdf_bytes = worksheets.image_worksheet(page_count=page_count)
+        rich.print(f"[bold]{page_count} pages, {page_count * 3} numbered images[/bold]")
+
+        for image_workers in (1, None):
+            # renumbering writes to the documents it's given, so every run detects on a fresh copy.
+            # only the renumbering itself is timed
+            pike_pdf, mu_pdf, _ = organizer.open_pdf(pdf_bytes)
+            pdf_file = organizer.parse_pdf(pike_pdf, mu_pdf)
+            numbered_pdf_file = questions.parse_numbered_pdf(pdf_file)
+            fonts = organizer.parse_pdf_fonts(mu_pdf)
+
+            start = time.perf_counter()
+            renumber.renumber_pdf(pike_pdf, mu_pdf, pdf_file, numbered_pdf_file, fonts, image_workers=image_workers)
+            elapsed = time.perf_counter() - start
+
+            label = "1 thread" if image_workers == 1 else "thread pool"
+            rich.print(f"{label:>12}: {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
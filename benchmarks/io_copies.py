@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import io
+import time
+import pathlib
+import tempfile
+import contextlib
+import typing as t
+
+import rich
+import pikepdf
+import fitz as pymupdf
+
+from benchmarks import worksheets
+from pdf_worksheet_organizer import organizer, pdfio
+
+# run from the repo root: python -m benchmarks.io_copies
+
+
+class CopyCounter:
+    def __init__(self) -> None:
+        self.copies = 0
+        self.bytes_copied = 0
+
+    def add(self, size: int) -> None:
+        self.copies += 1
+        self.bytes_copied += size
+
+
+@contextlib.contextmanager
+def count_copies() -> t.Generator[CopyCounter, None, None]:
+    # counts every time a whole document is materialized into a python buffer
+    counter = CopyCounter()
+    original_tobytes = pymupdf.Document.tobytes
+    original_mu_save = pymupdf.Document.save
+    original_pike_save = pikepdf.Pdf.save
+
+    def tobytes(self: pymupdf.Document, *args: t.Any, **kwargs: t.Any) -> bytes:
+        pdf_bytes = original_tobytes(self, *args, **kwargs)
+        counter.add(len(pdf_bytes))
+        return pdf_bytes
+
+    def saver(original: t.Callable[..., None]) -> t.Callable[..., None]:
+        def save(self: t.Any, target: t.Any = None, *args: t.Any, **kwargs: t.Any) -> None:
+            start = target.tell() if isinstance(target, io.BytesIO) else None
+            original(self, target, *args, **kwargs)
+            if start is not None:
+                counter.add(target.tell() - start)
+
+        return save
+
+    pymupdf.Document.tobytes = tobytes  # type: ignore
+    pymupdf.Document.save = saver(original_mu_save)  # type: ignore
+    pikepdf.Pdf.save = saver(original_pike_save)  # type: ignore
+    try:
+        yield counter
+    finally:
+        pymupdf.Document.tobytes = original_tobytes  # type: ignore
+        pymupdf.Document.save = original_mu_save  # type: ignore
+        pikepdf.Pdf.save = original_pike_save  # type: ignore
+
+
+def main() -> None:
+    pdf_bytes = worksheets.text_worksheet(page_count=20)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = pathlib.Path(temp_dir, "worksheet.pdf")
+        pdf_path.write_bytes(pdf_bytes)
+
+        sources: dict[str, t.Callable[[], pdfio.PdfSource]] = {
+            "path": lambda: pdf_path,
+            "bytes": lambda: pdf_bytes,
+            "memoryview": lambda: memoryview(pdf_bytes),
+            "BytesIO": lambda: io.BytesIO(pdf_bytes),
+        }
+
+        rich.print(f"[bold]input: {len(pdf_bytes):,} bytes, 20 pages[/bold]")
+        for name, make_source in sources.items():
+            with count_copies() as counter:
+                start = time.perf_counter()
+                final_pdf, _ = organizer.reorganize(make_source(), add_legend=False)
+                pdfio.save_pdf(final_pdf)
+                elapsed = time.perf_counter() - start
+
+            rich.print(
+                f"{name:>10}: {counter.copies} copies, {counter.bytes_copied:,} bytes copied "
+                f"({counter.bytes_copied / len(pdf_bytes):.1f}x input), {elapsed:.2f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
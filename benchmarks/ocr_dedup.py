@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import time
+import typing as t
+
+import rich
+
+from benchmarks import worksheets
+from pdf_worksheet_organizer import ocr, organizer, questions
+
+# run from the repo root: python -m benchmarks.ocr_dedup (needs tesseract)
+
+
+def main() -> None:
+    pdf_bytes = worksheets.image_worksheet(page_count=20, shared_header=True)
+    pike_pdf, mu_pdf, _ = organizer.open_pdf(pdf_bytes)
+    pdf_file = organizer.parse_pdf(pike_pdf, mu_pdf)
+
+    placements = sum(len(page.images) for page in pdf_file.pages)
+    distinct_images = len({image.xref for page in pdf_file.pages for image in page.images})
+
+    ocr_calls = 0
+    image_to_text = ocr.image_to_text
+
+    def counting_image_to_text(image: t.Any) -> t.Any:
+        nonlocal ocr_calls
+        ocr_calls += 1
+        return image_to_text(image)
+
+    ocr.image_to_text = counting_image_to_text
+    try:
+        start = time.perf_counter()
+        questions.parse_numbered_pdf(pdf_file)
+        elapsed = time.perf_counter() - start
+    finally:
+        ocr.image_to_text = image_to_text
+
+    rich.print(f"[bold]20 pages, {placements} image placements, {distinct_images} distinct images[/bold]")
+    rich.print(f"ocr calls: {ocr_calls} (saved {placements - ocr_calls}), detection took {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
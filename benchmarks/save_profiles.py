@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import time
+
+import rich
+
+from benchmarks import worksheets
+from pdf_worksheet_organizer import organizer, pdfio
+
+# run from the repo root: python -m benchmarks.save_profiles
+# (the image worksheet needs tesseract, like the organizer itself)
+
+
+def main() -> None:
+    inputs = {
+        "text (100 pages)": worksheets.text_worksheet(page_count=100),
+        "images (20 pages)": worksheets.image_worksheet(page_count=20),
+    }
+
+    for name, pdf_bytes in inputs.items():
+        rich.print(f"[bold]{name}: {len(pdf_bytes):,} bytes in[/bold]")
+
+        for profile in pdfio.SAVE_PROFILES:
+            # garbage collection renumbers objects in place, so every profile gets a freshly renumbered document
+            final_pdf, _ = organizer.reorganize(pdf_bytes, add_legend=False)
+
+            start = time.perf_counter()
+            output_bytes = pdfio.save_pdf(final_pdf, profile=profile)
+            elapsed = time.perf_counter() - start
+
+            assert output_bytes is not None
+            rich.print(f"{profile:>12}: {len(output_bytes):>12,} bytes, {elapsed * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import io
+
+import fitz as pymupdf
+from PIL import Image, ImageDraw, ImageFont
+
+FONT_PATH = "assets/JetBrainsMono-Bold.ttf"
+
+
+# synthetic worksheets, so benchmarks don't depend on any real (copyrighted) packets
+
+
+def text_worksheet(page_count: int, questions_per_page: int = 4, embed_font: bool = False) -> bytes:
+    mu_pdf = pymupdf.Document()
+    question_number = 5
+    # an embedded font gets picked up (and re-used) for the renumbered text, unlike the base 14 helvetica
+    font_options = {"fontname": "JetBrainsMono", "fontfile": FONT_PATH} if embed_font else {}
+
+    for _ in range(page_count):
+        mu_page: pymupdf.Page = mu_pdf.new_page()
+        for index in range(questions_per_page):
+            y = 72 + index * (700 // questions_per_page)
+            text = f"{question_number}. What is {question_number} + {index}?"
+            mu_page.insert_text((72, y), text, fontsize=12, **font_options)
+            question_number += 3
+
+    pdf_bytes: bytes = mu_pdf.tobytes()
+    return pdf_bytes
+
+
+def question_image(
+    question_number: int, size: tuple[int, int] = (600, 160), numbered: bool = True, header: str | None = None
+) -> Image.Image:
+    # an image that isn't `numbered` starts with the bare number, which isn't a question number.
+    # `header` is a line of text above the question
+    pil_image = Image.new("RGB", size, (255, 255, 255))
+    font_size = size[1] // 5
+    font = ImageFont.truetype(font=FONT_PATH, size=font_size)
+    draw = ImageDraw.Draw(pil_image)
+
+    top = 12
+    if header:
+        draw.text((12, top), header, font=font, fill=(0, 0, 0))
+        top += font_size * 3 // 2
+
+    number = f"{question_number}." if numbered else str(question_number)
+    draw.text((12, top), f"{number} Solve for x: {question_number}x + 4 = 20", font=font, fill=(0, 0, 0))
+    return pil_image
+
+
+def image_worksheet(page_count: int, questions_per_page: int = 3, shared_header: bool = False) -> bytes:
+    mu_pdf = pymupdf.Document()
+    question_number = 9
+
+    header_bytes_io = io.BytesIO()
+    question_image(0, size=(600, 60)).save(header_bytes_io, format="png")
+
+    for _ in range(page_count):
+        mu_page: pymupdf.Page = mu_pdf.new_page()
+        if shared_header:
+            mu_page.insert_image(pymupdf.Rect(72, 20, 540, 60), stream=header_bytes_io.getvalue())
+
+        for index in range(questions_per_page):
+            image_bytes_io = io.BytesIO()
+            question_image(question_number).save(image_bytes_io, format="png")
+
+            y = 72 + index * 220
+            mu_page.insert_image(pymupdf.Rect(72, y, 540, y + 125), stream=image_bytes_io.getvalue())
+            question_number += 2
+
+    pdf_bytes: bytes = mu_pdf.tobytes(deflate=True)
+    return pdf_bytes
+
+
+def mixed_worksheet(page_count: int) -> bytes:
+    # alternating text and image questions, so renumbering has to go back and forth between pymupdf and pikepdf
+    mu_pdf = pymupdf.Document()
+    question_number = 3
+
+    for _ in range(page_count):
+        mu_page: pymupdf.Page = mu_pdf.new_page()
+        for index in range(2):
+            y = 72 + index * 360
+            text = f"{question_number}. What is {question_number} + {index}?"
+            mu_page.insert_text((72, y), text, fontsize=12, fontname="JetBrainsMono", fontfile=FONT_PATH)
+
+            image_bytes_io = io.BytesIO()
+            question_image(question_number + 1).save(image_bytes_io, format="png")
+            mu_page.insert_image(pymupdf.Rect(72, y + 80, 540, y + 205), stream=image_bytes_io.getvalue())
+            question_number += 2
+
+    pdf_bytes: bytes = mu_pdf.tobytes(deflate=True)
+    return pdf_bytes
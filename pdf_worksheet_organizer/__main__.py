@@ -3,14 +3,92 @@ import pathlib
 import rich.traceback
 import rich_click as click
 
-from pdf_worksheet_organizer import organizer
+from pdf_worksheet_organizer import cache, ocr, organizer, pdfio, questionmap
 
 
 @click.command()
 @click.argument("input", type=click.Path(exists=True))
 @click.argument("output", type=click.Path())
 @click.option("-l", "--legend", is_flag=True, default=False, help="Add a legend of the renumbering")
-def organize(input: str, output: str, legend: bool) -> None:
+@click.option(
+    "-j", "--workers", type=click.IntRange(min=0), default=1, help="Processes used to parse pages (0 = one per core)"
+)
+@click.option(
+    "-s",
+    "--save-profile",
+    type=click.Choice(list(pdfio.SAVE_PROFILES)),
+    default="default",
+    help="Trade save time for output size (compact)",
+)
+@click.option(
+    "-b", "--batch-ocr", is_flag=True, default=False, help="OCR all images in one tesseract call (faster on many images)"
+)
+@click.option(
+    "-d", "--detect-only", is_flag=True, default=False, help="Write the detected questions to OUTPUT as json instead"
+)
+@click.option(
+    "-m",
+    "--question-map",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Renumber using a question map from --detect-only instead of detecting questions",
+)
+@click.option("-p", "--pages", default=None, help="Only renumber these pages, e.g. '3-7,10' (default: all)")
+@click.option(
+    "-n", "--start-number", type=click.IntRange(min=0), default=1, help="Number given to the first question"
+)
+@click.option(
+    "-c",
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Re-use results for the same pdf and options from this directory",
+)
+@click.option(
+    "--cache-size", type=click.IntRange(min=1), default=cache.DEFAULT_MAX_SIZE // 2**20, help="Cache size limit in MiB"
+)
+@click.option(
+    "-r",
+    "--digit-recognizer",
+    is_flag=True,
+    default=False,
+    help="Read image question numbers without tesseract where possible (needs numpy)",
+)
+@click.option("--ocr-timeout", type=click.FloatRange(min=0, min_open=True), default=None, help="Seconds of OCR per image")
+@click.option(
+    "--ocr-budget", type=click.FloatRange(min=0, min_open=True), default=None, help="Seconds of OCR for the whole pdf"
+)
+@click.option(
+    "--max-megapixels",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Largest image OCR'd at full size",
+)
+@click.option(
+    "--ocr-policy",
+    type=click.Choice(ocr.OCR_POLICIES),
+    default="downscale",
+    help="What to do with an image that hits an OCR limit (skip, downscale, fail)",
+)
+def organize(
+    input: str,
+    output: str,
+    legend: bool,
+    workers: int,
+    save_profile: str,
+    batch_ocr: bool,
+    detect_only: bool,
+    question_map: str | None,
+    pages: str | None,
+    start_number: int,
+    cache_dir: str | None,
+    cache_size: int,
+    digit_recognizer: bool,
+    ocr_timeout: float | None,
+    ocr_budget: float | None,
+    max_megapixels: float | None,
+    ocr_policy: ocr.OcrPolicy,
+) -> None:
     input_path = pathlib.Path(input).resolve()
     output_path = pathlib.Path(output).resolve()
 
@@ -19,13 +97,86 @@ def organize(input: str, output: str, legend: bool) -> None:
     if input_path == output_path:
         raise FileExistsError(f"Input and output paths are the same: {input_path}")
 
+    if detect_only and question_map:
+        raise click.UsageError("--detect-only and --question-map can't be used together")
+    if question_map:
+        # a question map keeps the pages and start number it was detected with, and is never cached
+        start_number_source = click.get_current_context().get_parameter_source("start_number")
+        map_conflicts = {
+            "--pages": pages is not None,
+            "--start-number": start_number_source != click.core.ParameterSource.DEFAULT,
+            "--cache-dir": cache_dir is not None,
+        }
+        for option, is_set in map_conflicts.items():
+            if is_set:
+                raise click.UsageError(f"{option} and --question-map can't be used together")
+
+    budget = ocr.OcrBudget(
+        image_timeout=ocr_timeout,
+        max_pixels=round(max_megapixels * 1_000_000) if max_megapixels else None,
+        document_timeout=ocr_budget,
+        policy=ocr_policy,
+    )
+
     if output_path.is_dir():
-        new_name = f"{input_path.stem}-replaced.pdf".replace(" ", "-")
+        new_suffix = "-questions.json" if detect_only else "-replaced.pdf"
+        new_name = f"{input_path.stem}{new_suffix}".replace(" ", "-")
         output_path = output_path / new_name
 
-    new_pdf, questions_count = organizer.reorganize(input_path, add_legend=legend)
-    new_pdf.save(output_path, garbage=3, deflate=True)
+    if detect_only:
+        detected_map = organizer.detect_questions(
+            input_path,
+            workers=workers,
+            batch_ocr=batch_ocr,
+            pages=pages,
+            start_number=start_number,
+            digit_recognizer=digit_recognizer,
+            ocr_budget=budget,
+        )
+        with output_path.open("w") as file:
+            questionmap.dump_question_map(detected_map, file)
+
+        print_ocr_limits_hit(budget)
+        relative_output_path = output_path.relative_to(pathlib.Path.cwd())
+        rich.print(
+            f"[bold][green]Saving question map to [white]'{relative_output_path}'[/white] [white]([green]{detected_map['questions_count']} questions[/green])[/white][/bold][/green]"
+        )
+        return
 
+    if question_map:
+        with open(question_map) as file:
+            loaded_map = questionmap.load_question_map(file)
+        new_pdf, questions_count = organizer.reorganize_with_question_map(input_path, loaded_map, add_legend=legend)
+        pdfio.save_pdf(new_pdf, output_path, profile=save_profile)
+    elif cache_dir:
+        result_cache = cache.ResultCache(cache_dir, max_size=cache_size * 2**20)
+        pdf_bytes, questions_count = cache.reorganize(
+            input_path,
+            result_cache,
+            add_legend=legend,
+            workers=workers,
+            batch_ocr=batch_ocr,
+            pages=pages,
+            start_number=start_number,
+            digit_recognizer=digit_recognizer,
+            ocr_budget=budget,
+            profile=save_profile,
+        )
+        output_path.write_bytes(pdf_bytes)
+    else:
+        new_pdf, questions_count = organizer.reorganize(
+            input_path,
+            add_legend=legend,
+            workers=workers,
+            batch_ocr=batch_ocr,
+            pages=pages,
+            start_number=start_number,
+            digit_recognizer=digit_recognizer,
+            ocr_budget=budget,
+        )
+        pdfio.save_pdf(new_pdf, output_path, profile=save_profile)
+
+    print_ocr_limits_hit(budget)
     relative_output_path = output_path.relative_to(pathlib.Path.cwd())
 
     rich.print(
@@ -33,6 +184,14 @@ def organize(input: str, output: str, legend: bool) -> None:
     )
 
 
+def print_ocr_limits_hit(budget: ocr.OcrBudget) -> None:
+    if not budget.limits_hit:
+        return
+
+    limits_hit = ", ".join(f"{limit} x{count}" for limit, count in budget.limits_hit.most_common())
+    rich.print(f"[bold][yellow]OCR limits hit ({budget.policy}): [white]{limits_hit}[/white][/yellow][/bold]")
+
+
 if __name__ == "__main__":
     rich.traceback.install()
     organize()
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import os
+import asyncio
+import pathlib
+import tempfile
+import functools
+import typing as t
+import concurrent.futures
+
+import pikepdf
+import fitz as pymupdf
+
+from pdf_worksheet_organizer import ocr, organizer, questions, parallel
+from pdf_worksheet_organizer.datatypes import ParsedImage, ParsedPage
+from pdf_worksheet_organizer.pdfio import PdfSource
+from pdf_worksheet_organizer.organizer import PageSelection
+
+OCR_CONCURRENCY = os.cpu_count() or 1
+
+T = t.TypeVar("T")
+
+
+@functools.lru_cache(maxsize=None)
+def default_executor() -> concurrent.futures.ProcessPoolExecutor:
+    # pymupdf isn't thread safe, so the cpu-bound stages run in processes rather than threads.
+    # shared by every call so one event loop can drive many documents without a pool per document
+    return concurrent.futures.ProcessPoolExecutor()
+
+
+async def reorganize(
+    source: PdfSource,
+    add_legend: bool,
+    *,
+    timeout: float | None = None,
+    executor: concurrent.futures.Executor | None = None,
+    ocr_concurrency: int = OCR_CONCURRENCY,
+    pages: PageSelection | None = None,
+    start_number: int = 1,
+) -> tuple[pymupdf.Document, int]:
+    # cancelling (or timing out) stops any running tesseract processes straight away.
+    # a stage already running in the executor is waited for (it may still be using the temp directory),
+    # but its result is discarded
+    pipeline = reorganize_pipeline(
+        source,
+        add_legend,
+        executor or default_executor(),
+        ocr_concurrency,
+        pages if pages is None or isinstance(pages, str) else list(pages),
+        start_number,
+    )
+    return await asyncio.wait_for(pipeline, timeout)
+
+
+async def picklable_source(source: PdfSource) -> str | bytes:
+    # paths are passed on as is, the worker opens (or memory-maps) them itself
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    # reading a file (or socket) can block, so it's done off the event loop
+    return await asyncio.to_thread(source.read)
+
+
+async def reorganize_pipeline(
+    source: PdfSource,
+    add_legend: bool,
+    executor: concurrent.futures.Executor,
+    ocr_concurrency: int,
+    pages: str | list[int] | None = None,
+    start_number: int = 1,
+) -> tuple[pymupdf.Document, int]:
+    source = await picklable_source(source)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = str(pathlib.Path(temp_dir, "source.pdf"))
+
+        page_numbers, parsed_pages, png_images = await run_stage(executor, parse_pages, source, pdf_path, pages)
+        parsed_pages = await ocr_parsed_pages(parsed_pages, png_images, asyncio.Semaphore(ocr_concurrency))
+        pdf_bytes, questions_count = await run_stage(
+            executor, renumber_pages, pdf_path, parsed_pages, page_numbers, add_legend, start_number
+        )
+
+    return pymupdf.Document(stream=pdf_bytes), questions_count
+
+
+async def run_stage(executor: concurrent.futures.Executor, stage: t.Callable[..., T], *args: t.Any) -> T:
+    # a stage can't be stopped once it's running in the executor, and it reads & writes the pipeline's
+    # temp directory -- so when the pipeline is cancelled, a running stage is waited for before the directory
+    # is removed from under it
+    concurrent_future = executor.submit(stage, *args)
+    future = asyncio.wrap_future(concurrent_future)
+
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        if not concurrent_future.cancel():
+            await asyncio.wait([future])
+            # the result (or error) is discarded, but marked as seen so asyncio doesn't log it
+            if not future.cancelled():
+                future.exception()
+        raise
+
+
+def parse_pages(
+    source: str | bytes, pdf_path: str, pages: str | list[int] | None = None
+) -> tuple[list[int], list[ParsedPage], dict[int, bytes]]:
+    pike_pdf, mu_pdf, page_numbers = organizer.open_pdf(source, pages)
+    # only the saved copy is needed once the pages are parsed
+    with pike_pdf, mu_pdf:
+        mu_pdf.save(pdf_path)
+
+        pdf_file = organizer.parse_pdf(pike_pdf, mu_pdf, page_numbers)
+
+        parsed_pages: list[ParsedPage] = []
+        # keyed by xref, so images shared between pages are only decoded (and ocr'd) once
+        png_images: dict[int, bytes] = {}
+
+        for page in pdf_file.pages:
+            parsed_images: list[ParsedImage] = []
+
+            for image in page.images:
+                parsed_image = ParsedImage(
+                    id=image.id, xref=image.xref, bounding_box=image.bounding_box, word=None, number_bounding_box=None
+                )
+                parsed_images.append(parsed_image)
+
+                # decoding happens here (in the executor) so the event loop only has to pipe bytes to tesseract
+                if image.xref not in png_images:
+                    png_images[image.xref] = ocr.image_to_png(image)
+
+            parsed_pages.append(ParsedPage(text=page.text, images=parsed_images))
+
+    return page_numbers, parsed_pages, png_images
+
+
+async def ocr_parsed_pages(
+    parsed_pages: list[ParsedPage],
+    png_images: dict[int, bytes],
+    semaphore: asyncio.Semaphore,
+) -> list[ParsedPage]:
+    tasks = {xref: asyncio.ensure_future(ocr_png(png_bytes, semaphore)) for xref, png_bytes in png_images.items()}
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        # gather doesn't cancel the other images when one fails (or when we're cancelled)
+        for task in tasks.values():
+            task.cancel()
+        raise
+
+    ocr_parsed_pages: list[ParsedPage] = []
+
+    for page in parsed_pages:
+        parsed_images: list[ParsedImage] = []
+
+        for parsed_image in page.images:
+            question_number = tasks[parsed_image.xref].result()
+            if question_number:
+                word, number_bbox = question_number
+                parsed_image = parsed_image._replace(word=word, number_bounding_box=number_bbox)
+            parsed_images.append(parsed_image)
+
+        ocr_parsed_pages.append(page._replace(images=parsed_images))
+
+    return ocr_parsed_pages
+
+
+async def ocr_png(png_bytes: bytes, semaphore: asyncio.Semaphore) -> tuple[str, pymupdf.Rect] | None:
+    async with semaphore:
+        image_data = await ocr.png_to_text_async(png_bytes)
+
+    return questions.find_question_number(image_data)
+
+
+def renumber_pages(
+    pdf_path: str,
+    parsed_pages: list[ParsedPage],
+    page_numbers: list[int],
+    add_legend: bool,
+    start_number: int = 1,
+) -> tuple[bytes, int]:
+    with pikepdf.open(pdf_path, access_mode=pikepdf.AccessMode.mmap) as pike_pdf, pymupdf.Document(pdf_path) as mu_pdf:
+        pdf_file, numbered_pdf_file = parallel.merge_parsed_pages(pike_pdf, mu_pdf, parsed_pages, page_numbers)
+        numbered_pdf_file = numbered_pdf_file._replace(start_number=start_number)
+        final_pdf = organizer.build_final_pdf(pike_pdf, mu_pdf, pdf_file, numbered_pdf_file, add_legend)
+        pdf_bytes: bytes = final_pdf.tobytes()
+
+        # renumbering images hands back a new document, which is only ever used here
+        if final_pdf is not mu_pdf:
+            final_pdf.close()
+
+    return pdf_bytes, numbered_pdf_file.questions_count
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import io
+import os
+import json
+import time
+import pathlib
+import hashlib
+import tempfile
+import contextlib
+import typing as t
+
+from pdf_worksheet_organizer import organizer, pdfio, renumber
+from pdf_worksheet_organizer.organizer import PageSelection
+from pdf_worksheet_organizer.pdfio import PdfSource
+from pdf_worksheet_organizer.ocr import OcrBudget
+
+# bump whenever the same input and options would give a different output,
+# so results from an older version are never served
+CACHE_VERSION = 2
+
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+CACHE_ENTRY_SUFFIX = ".pdf"
+CACHE_TEMP_SUFFIX = ".tmp"
+
+# a temp file this old was left behind by a process that died before renaming it into place.
+# younger ones may still be being written
+STALE_TEMP_AGE = 60 * 60
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ResultCache:
+    # one file per result, named by its key. entries are written to a temp file and renamed into place,
+    # so any number of processes can share a directory without ever reading a half-written entry.
+    # an entry's mtime is bumped on every hit, and the least recently used entries go first when it's full
+
+    def __init__(self, directory: str | os.PathLike[str], max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.directory = pathlib.Path(directory)
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def entry_path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}{CACHE_ENTRY_SUFFIX}"
+
+    def get(self, key: str) -> tuple[bytes, int] | None:
+        path = self.entry_path(key)
+
+        try:
+            entry = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            # never cached, or evicted by another process in the meantime
+            return None
+
+        # the question count is stored on the first line, in front of the pdf
+        questions_count, _, pdf_bytes = entry.partition(b"\n")
+        return pdf_bytes, int(questions_count)
+
+    def put(self, key: str, pdf_bytes: bytes, questions_count: int) -> None:
+        file = tempfile.NamedTemporaryFile(dir=self.directory, suffix=CACHE_TEMP_SUFFIX, delete=False)
+
+        try:
+            with file:
+                file.write(f"{questions_count}\n".encode())
+                file.write(pdf_bytes)
+            os.replace(file.name, self.entry_path(key))
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(file.name)
+            raise
+
+        self.evict()
+
+    def evict(self) -> None:
+        self.remove_stale_temp_files()
+
+        entries: list[tuple[float, int, pathlib.Path]] = []
+
+        for path in self.directory.glob(f"*{CACHE_ENTRY_SUFFIX}"):
+            with contextlib.suppress(FileNotFoundError):
+                stat = path.stat()
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+
+            # another process may have evicted it already
+            with contextlib.suppress(FileNotFoundError):
+                path.unlink()
+            total_size -= size
+
+    def remove_stale_temp_files(self) -> None:
+        # a crash between writing an entry and renaming it into place would otherwise leave its temp file forever
+        stale_time = time.time() - STALE_TEMP_AGE
+
+        for path in self.directory.glob(f"*{CACHE_TEMP_SUFFIX}"):
+            with contextlib.suppress(FileNotFoundError):
+                if path.stat().st_mtime < stale_time:
+                    path.unlink()
+
+
+def reorganize(
+    source: PdfSource,
+    cache: ResultCache,
+    add_legend: bool,
+    workers: int = 1,
+    batch_ocr: bool = False,
+    pages: PageSelection | None = None,
+    start_number: int = 1,
+    digit_recognizer: bool = False,
+    ocr_budget: OcrBudget | None = None,
+    profile: str = "default",
+) -> tuple[bytes, int]:
+    # same as `organizer.reorganize`, but returns the saved pdf -- which is what's cached
+    source_hash, source = hash_source(source)
+    options = {
+        "version": CACHE_VERSION,
+        "legend": add_legend,
+        "batch_ocr": batch_ocr,
+        "pages": pages if pages is None or isinstance(pages, str) else sorted(set(pages)),
+        "start_number": start_number,
+        "digit_recognizer": digit_recognizer,
+        "number_format": renumber.QUESTION_NUMBER_FORMAT,
+        "profile": profile,
+    }
+    key = cache_key(source_hash, options)
+
+    cached = cache.get(key)
+    if cached:
+        return cached
+
+    new_pdf, questions_count = organizer.reorganize(
+        source,
+        add_legend,
+        workers=workers,
+        batch_ocr=batch_ocr,
+        pages=pages,
+        start_number=start_number,
+        digit_recognizer=digit_recognizer,
+        ocr_budget=ocr_budget,
+    )
+    pdf_bytes = t.cast(bytes, pdfio.save_pdf(new_pdf, profile=profile))
+
+    # a result that ran into an ocr limit may be missing questions, so it's only good for this once
+    if not ocr_budget or not ocr_budget.limits_hit:
+        cache.put(key, pdf_bytes, questions_count)
+
+    return pdf_bytes, questions_count
+
+
+def cache_key(source_hash: str, options: dict[str, t.Any]) -> str:
+    options_json = json.dumps(options, sort_keys=True)
+    return hashlib.sha256(f"{source_hash}:{options_json}".encode()).hexdigest()
+
+
+def hash_source(source: PdfSource) -> tuple[str, PdfSource]:
+    # also returns the source to reorganize, since a stream can only be read once
+    if isinstance(source, (str, os.PathLike)):
+        source_hash = hashlib.sha256()
+        # read in chunks, so a large pdf is never held in memory just to hash it
+        with open(source, "rb") as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+                source_hash.update(chunk)
+        return source_hash.hexdigest(), source
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest(), source
+    if isinstance(source, io.BytesIO):
+        return hashlib.sha256(source.getbuffer()).hexdigest(), source
+
+    pdf_bytes = source.read()
+    return hashlib.sha256(pdf_bytes).hexdigest(), pdf_bytes
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import io
 import re
+import functools
+import itertools
 import typing as t
 from dataclasses import dataclass
 
@@ -10,7 +13,6 @@ import fitz as pymupdf
 from PIL import ImageFont
 
 if t.TYPE_CHECKING:
-    import io
     from PIL import Image
 
 # https://pymupdf.readthedocs.io/en/latest/page.html#Page.get_image_info
@@ -73,6 +75,7 @@ class MuTextDict(t.TypedDict):
 
 PdfText: t.TypeAlias = "list[PdfWord]"
 PdfImages: t.TypeAlias = "list[PdfImage]"
+PdfFonts: t.TypeAlias = "dict[int, PdfFont]"
 
 
 # output of pytesseract.image_to_data w/ output_type = Output.DICT
@@ -92,10 +95,20 @@ class OcrImageData(t.TypedDict):
     text: list[str]
 
 
-class PdfFont(t.NamedTuple):
+@dataclass(eq=False)
+class PdfFont:
+    xref: int
     name: str
     encoding: str
-    buffer: io.BytesIO
+    mu_pdf: pymupdf.Document
+
+    @functools.cached_property
+    def buffer(self) -> bytes:
+        # only extracted the first time a numbered element actually needs this font.
+        # empty if the font isn't embedded in the pdf
+        # (basename, ext, type, content)
+        mu_font_info: tuple[str, str, str, bytes] = self.mu_pdf.extract_font(xref=self.xref)
+        return mu_font_info[3]
 
     def as_pil_font(self, font_size: int) -> ImageFont.FreeTypeFont | None:
         # true type font encodings:
@@ -120,12 +133,12 @@ class PdfFont(t.NamedTuple):
         else:
             font_encoding = self.encoding
         try:
-            return ImageFont.truetype(font=self.buffer.getvalue(), size=font_size, encoding=font_encoding)
-        except UnicodeDecodeError:
+            return ImageFont.truetype(font=io.BytesIO(self.buffer), size=font_size, encoding=font_encoding)
+        except (UnicodeDecodeError, OSError):
             return None
 
     def as_pymupdf_font(self) -> pymupdf.Font:
-        return pymupdf.Font(fontname=self.name, fontbuffer=self.buffer.getvalue())
+        return pymupdf.Font(fontname=self.name, fontbuffer=self.buffer)
 
 
 @dataclass(frozen=True)
@@ -134,8 +147,28 @@ class PdfImage:
     stream: pikepdf.Stream
     bounding_box: pymupdf.Rect
 
+    @property
+    def xref(self) -> int:
+        # same object number in pymupdf and pikepdf, since pikepdf opens what pymupdf saved.
+        # pages that share an image share its xref
+        return self.stream.objgen[0]
+
+    @property
+    def size(self) -> tuple[int, int]:
+        # read from the image's dictionary, without decoding it
+        return int(self.stream.Width), int(self.stream.Height)
+
     def as_pil_image(self) -> Image.Image:
-        return pikepdf.PdfImage(self.stream).as_pil_image()
+        # as a viewer would show it. pikepdf applies `/Decode` to everything but jpegs, which it leaves to
+        # the jpeg's own markers -- and those only cover adobe's inverted cmyk, not a plain inverted jpeg
+        pil_image = pikepdf.PdfImage(self.stream).as_pil_image()
+
+        if self.stream.get("/Filter") == pikepdf.Name.DCTDecode and "adobe" not in pil_image.info:
+            decode = [float(value) for value in self.stream.get("/Decode", [])]
+            if decode and decode == [1.0, 0.0] * (len(decode) // 2):
+                pil_image = pil_image.point(lambda value: 255 - value)
+
+        return pil_image
 
 
 @dataclass(frozen=True)
@@ -161,6 +194,8 @@ class PdfPage(t.NamedTuple):
 
 class PdfFile(t.NamedTuple):
     pages: list[PdfPage]
+    # the document page each of `pages` came from -- only the selected pages are ever parsed
+    page_numbers: list[int]
 
 
 @dataclass(frozen=True)
@@ -189,11 +224,63 @@ class PdfNumberedPage(t.NamedTuple):
 
 class PdfNumberedFile(t.NamedTuple):
     pages: list[PdfNumberedPage]
+    # new number of the first question
+    start_number: int = 1
 
     @property
     def questions_count(self) -> int:
         return sum(len(page.elements) for page in self.pages)
 
+    @property
+    def first_question_numbers(self) -> list[int]:
+        # prefix sum of the per-page counts -- the new number of the first question on each page.
+        # this is what lets pages be detected independently (and in any order) before renumbering
+        page_counts = (len(page.elements) for page in self.pages)
+        return list(itertools.accumulate(page_counts, initial=self.start_number))[:-1]
+
+
+# json question map -- what `--detect-only` writes and `--question-map` reads back
+class QuestionMapElement(t.TypedDict):
+    type: t.Literal["text", "image"]
+    original_number: int
+    new_number: int
+    # text elements: the word's whole text, image elements: the word ocr found
+    text: str
+    bounding_box: tuple[float, float, float, float]
+    # image elements only, None for text
+    image_id: int | None
+    number_bounding_box: tuple[float, float, float, float] | None
+
+
+class QuestionMapPage(t.TypedDict):
+    # numbered from 1, like `--pages`
+    page: int
+    elements: list[QuestionMapElement]
+
+
+class QuestionMap(t.TypedDict):
+    version: int
+    questions_count: int
+    start_number: int
+    pages: list[QuestionMapPage]
+
+
+# pikepdf streams (and re.Match objects) can't cross process boundaries,
+# so workers send back plain data and the parent re-attaches its own streams by image id
+class ParsedImage(t.NamedTuple):
+    id: int
+    xref: int
+    bounding_box: pymupdf.Rect
+    # only set if ocr found a question number in the image
+    word: str | None
+    number_bounding_box: pymupdf.Rect | None
+
+
+class ParsedPage(t.NamedTuple):
+    text: PdfText
+    images: list[ParsedImage]
+
+
 class Padding(t.NamedTuple):
     left: int
     top: int
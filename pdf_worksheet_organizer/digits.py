@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import pathlib
+import contextlib
+import typing as t
+
+import fitz as pymupdf
+from PIL import Image, ImageDraw, ImageFont
+
+from pdf_worksheet_organizer.datatypes import PdfFonts
+from pdf_worksheet_organizer.exceptions import MissingDependencyException
+from pdf_worksheet_organizer.questions import NUMBERED_QUESTION_TEXT_REGEX
+
+# numpy is optional -- it's only needed for the digit recognizer
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore
+
+if t.TYPE_CHECKING:
+    import numpy.typing as npt
+
+# rendered when none of the document's fonts have digits (or can be loaded at all)
+BUNDLED_FONT_PATH = pathlib.Path(__file__).parent.parent / "assets" / "JetBrainsMono-Bold.ttf"
+
+# the "." is told apart by its size, every other character by its shape
+TEMPLATE_CHARACTERS = "0123456789)"
+TEMPLATE_FONT_SIZE = 48
+# glyphs and templates are compared as TEMPLATE_SIZE x TEMPLATE_SIZE greyscale squares
+TEMPLATE_SIZE = 24
+
+# how different from the background (top left pixel) a pixel has to be to count as ink
+INK_THRESHOLD = 96
+# question numbers start in the left part of the image
+MARGIN_FRACTION = 0.25
+# a gap wider than this (relative to the number's height) ends the word
+WORD_GAP_RATIO = 0.5
+# a glyph this small (relative to the number's height) and sitting on the baseline is a "."
+PERIOD_SIZE_RATIO = 0.3
+
+# glyphs matched with a lower score than this are handed to tesseract instead
+MIN_CONFIDENCE = 0.75
+
+
+class Recognition(t.NamedTuple):
+    question_number: tuple[str, pymupdf.Rect] | None
+    # the lowest template match score of the word's glyphs -- 0.0 if there's nothing to match
+    confidence: float
+
+    @property
+    def confident(self) -> bool:
+        # only a question number that was found is ever trusted. the recognizer just reads the first word
+        # in the margin, so when that isn't a question number (e.g. a header line above it), one can still
+        # be further down -- and that's for tesseract to find
+        return self.question_number is not None and self.confidence >= MIN_CONFIDENCE
+
+
+class DigitRecognizer:
+    # tesseract is a whole ocr engine, but a question number is just a few digits and a "." or ")".
+    # so the first word in an image's margin is cut into glyphs, and each glyph is matched against
+    # digits rendered from the document's own fonts. anything it isn't sure about goes to tesseract
+
+    def __init__(self, fonts: PdfFonts) -> None:
+        require_numpy()
+
+        characters: list[str] = []
+        templates: list[npt.NDArray[np.float64]] = []
+
+        for pil_font in self.template_fonts(fonts):
+            for character in TEMPLATE_CHARACTERS:
+                template = render_template(pil_font, character)
+                if template is not None:
+                    characters.append(character)
+                    templates.append(template)
+
+        self.characters = characters
+        # (templates, TEMPLATE_SIZE ** 2), so a glyph is scored against every template in one product
+        self.templates = np.stack(templates)
+
+    def template_fonts(self, fonts: PdfFonts) -> list[ImageFont.FreeTypeFont]:
+        pil_fonts: list[ImageFont.FreeTypeFont] = []
+
+        for font in fonts.values():
+            if not font.buffer or not has_digits(font.as_pymupdf_font()):
+                continue
+
+            pil_font = font.as_pil_font(TEMPLATE_FONT_SIZE)
+            if pil_font:
+                pil_fonts.append(pil_font)
+
+        pil_fonts.append(ImageFont.truetype(font=str(BUNDLED_FONT_PATH), size=TEMPLATE_FONT_SIZE))
+        return pil_fonts
+
+    def recognize(self, pil_image: Image.Image) -> Recognition:
+        gray = np.asarray(pil_image.convert("L"), dtype=np.int16)
+        # how far each pixel is from the background, anti-aliased edges included
+        ink_levels = np.abs(gray - gray[0, 0])
+        ink = ink_levels > INK_THRESHOLD
+
+        line = find_first_line(ink)
+        if line is None:
+            # nothing dark enough in the margin -- a faint or low contrast number could still be there,
+            # so tesseract gets to look
+            return Recognition(question_number=None, confidence=0.0)
+
+        top, bottom = line
+        glyphs = find_first_word(ink[top:bottom])
+        height = max(glyph_bottom - glyph_top for _, _, glyph_top, glyph_bottom in glyphs)
+
+        word = ""
+        confidence = 1.0
+
+        for left, right, glyph_top, glyph_bottom in glyphs:
+            glyph_height = glyph_bottom - glyph_top
+            is_small = max(glyph_height, right - left) <= height * PERIOD_SIZE_RATIO
+            if is_small and glyph_bottom >= bottom - top - height * PERIOD_SIZE_RATIO:
+                word += "."
+                continue
+
+            glyph = normalize_glyph(ink_levels[top + glyph_top : top + glyph_bottom, left:right])
+            scores = self.templates @ glyph
+            best = int(np.argmax(scores))
+
+            word += self.characters[best]
+            confidence = min(confidence, float(scores[best]))
+
+        if not NUMBERED_QUESTION_TEXT_REGEX.fullmatch(word):
+            return Recognition(question_number=None, confidence=confidence)
+
+        word_left = glyphs[0][0]
+        word_right = glyphs[-1][1]
+        word_top = top + min(glyph[2] for glyph in glyphs)
+        word_bottom = top + max(glyph[3] for glyph in glyphs)
+
+        number_bbox = pymupdf.Rect(word_left, word_top, word_right, word_bottom)
+        return Recognition(question_number=(word, number_bbox), confidence=confidence)
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise MissingDependencyException("numpy", "the digit recognizer")
+
+
+def has_digits(mu_font: pymupdf.Font) -> bool:
+    # subset fonts only have the glyphs the document used, which often aren't all of the digits
+    return all(mu_font.has_glyph(ord(character)) for character in TEMPLATE_CHARACTERS)
+
+
+def render_template(pil_font: ImageFont.FreeTypeFont, character: str) -> npt.NDArray[np.float64] | None:
+    canvas = Image.new("L", (TEMPLATE_FONT_SIZE * 2, TEMPLATE_FONT_SIZE * 2), 0)
+    draw = ImageDraw.Draw(canvas)
+
+    with contextlib.suppress(UnicodeEncodeError, OSError):
+        draw.text((TEMPLATE_FONT_SIZE // 2, TEMPLATE_FONT_SIZE // 2), character, font=pil_font, fill=255)
+
+    bbox = canvas.getbbox()
+    if not bbox:
+        return None
+
+    return normalize_glyph(np.asarray(canvas.crop(bbox)))
+
+
+def normalize_glyph(ink_levels: npt.NDArray[t.Any]) -> npt.NDArray[np.float64]:
+    # centred in a square (so thin glyphs like "1" keep their shape), scaled down, and made zero mean
+    # and unit length -- which turns the dot product of two glyphs into their correlation.
+    # grey levels are kept, at small sizes the anti-aliasing is most of a glyph's shape
+    height, width = ink_levels.shape
+    side = max(height, width)
+
+    square = np.zeros((side, side), dtype=np.uint8)
+    top = (side - height) // 2
+    left = (side - width) // 2
+    square[top : top + height, left : left + width] = np.clip(ink_levels, 0, 255)
+
+    resized = Image.fromarray(square).resize((TEMPLATE_SIZE, TEMPLATE_SIZE), Image.Resampling.BOX)
+    glyph = np.asarray(resized, dtype=np.float64).ravel()
+
+    glyph -= glyph.mean()
+    norm = np.linalg.norm(glyph)
+    return glyph / norm if norm else glyph
+
+
+def find_first_line(ink: npt.NDArray[np.bool_]) -> tuple[int, int] | None:
+    margin = ink[:, : max(round(ink.shape[1] * MARGIN_FRACTION), 1)]
+    rows = margin.any(axis=1)
+
+    if not rows.any():
+        return None
+
+    top = int(np.argmax(rows))
+    # the first row after `top` without any ink in the margin
+    blank_rows = np.flatnonzero(~rows[top:])
+    bottom = top + int(blank_rows[0]) if blank_rows.size else len(rows)
+
+    return top, bottom
+
+
+def find_first_word(line: npt.NDArray[np.bool_]) -> list[tuple[int, int, int, int]]:
+    # each glyph as (left, right, top, bottom), top & bottom relative to the line
+    columns = line.any(axis=0)
+    ink_columns = np.flatnonzero(columns)
+
+    # a glyph is a run of consecutive columns with ink in them
+    breaks = np.flatnonzero(np.diff(ink_columns) > 1)
+    lefts = np.concatenate(([ink_columns[0]], ink_columns[breaks + 1]))
+    rights = np.concatenate((ink_columns[breaks], [ink_columns[-1]])) + 1
+
+    glyphs: list[tuple[int, int, int, int]] = []
+
+    for left, right in zip(lefts, rights):
+        if glyphs and left - glyphs[-1][1] > line.shape[0] * WORD_GAP_RATIO:
+            break
+
+        rows = np.flatnonzero(line[:, left:right].any(axis=1))
+        glyphs.append((int(left), int(right), int(rows[0]), int(rows[-1]) + 1))
+
+    return glyphs
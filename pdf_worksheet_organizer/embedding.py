@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import fitz as pymupdf
+
+from pdf_worksheet_organizer.datatypes import PdfFonts
+from pdf_worksheet_organizer.parsing import parse_font_from_fonts
+
+# what pymupdf's `TextWriter` falls back to when it isn't given a font
+DEFAULT_FONT_NAME = "helv"
+
+
+class FontEmbedder:
+    # mupdf embeds a font once per document (it looks fonts up by their digest), but only if it's
+    # handed the same font every time. so every replacement font is built once here and re-used
+    # for every page -- which also skips re-parsing the font file for each question
+
+    def __init__(self, fonts: PdfFonts) -> None:
+        self.fonts = fonts
+        # keyed by the numbered word's font name
+        self.mu_fonts: dict[str, pymupdf.Font] = {}
+
+    def font_for(self, font_name: str) -> pymupdf.Font:
+        mu_font = self.mu_fonts.get(font_name)
+
+        if not mu_font:
+            mu_font = parse_font_from_fonts(font_name, self.fonts) or self.default_font()
+            self.mu_fonts[font_name] = mu_font
+
+        return mu_font
+
+    def default_font(self) -> pymupdf.Font:
+        default_font = self.mu_fonts.get(DEFAULT_FONT_NAME)
+
+        if not default_font:
+            default_font = pymupdf.Font(DEFAULT_FONT_NAME)
+            self.mu_fonts[DEFAULT_FONT_NAME] = default_font
+
+        return default_font
+
+    def subset_fonts(self, mu_pdf: pymupdf.Document) -> None:
+        # the replacement fonts are embedded whole, even though only a few digits and the rest of
+        # each question's first line are ever written with them.
+        # mupdf works out the glyphs each page uses itself, so this is safe for the document's own fonts too
+        mu_pdf.subset_fonts()
@@ -6,4 +6,50 @@ class NoAvailablePositionException(PdfWorksheetOrganizerException):
     """Raised when no available position can be found for an element."""
     
     def __init__(self, element_name: str) -> None:
-        super().__init__(f"No available position for {element_name}")
\ No newline at end of file
+        super().__init__(f"No available position for {element_name}")
+
+class QuestionMapException(PdfWorksheetOrganizerException):
+    """Raised when a question map doesn't match the document it's applied to."""
+
+    def __init__(self, page_num: int, reason: str) -> None:
+        super().__init__(f"Question map doesn't match page {page_num + 1}: {reason}")
+
+class InvalidQuestionMapException(PdfWorksheetOrganizerException):
+    """Raised when a question map isn't one this version can read, before it's matched against any page."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"Invalid question map: {reason}")
+        self.reason = reason
+
+    def __reduce__(self) -> tuple[type, tuple[str]]:
+        # rebuilt from its arguments rather than its message when it's sent back from a worker process
+        return self.__class__, (self.reason,)
+
+class PageSelectionException(PdfWorksheetOrganizerException):
+    """Raised when a page selection can't be parsed or is out of the document's range."""
+
+    def __init__(self, selection: str, page_count: int) -> None:
+        super().__init__(f"Invalid page selection {selection!r} for a document with {page_count} pages")
+
+class MissingDependencyException(PdfWorksheetOrganizerException):
+    """Raised when an optional dependency a feature needs isn't installed."""
+
+    def __init__(self, package_name: str, feature_name: str) -> None:
+        super().__init__(f"{package_name} is required for {feature_name} (pip install {package_name})")
+        self.package_name = package_name
+        self.feature_name = feature_name
+
+    def __reduce__(self) -> tuple[type, tuple[str, str]]:
+        # rebuilt from its arguments rather than its message when it's sent back from a worker process
+        return self.__class__, (self.package_name, self.feature_name)
+
+class OcrLimitException(PdfWorksheetOrganizerException):
+    """Raised when an ocr limit is hit and the budget's policy is to fail."""
+
+    def __init__(self, limit_name: str) -> None:
+        super().__init__(f"OCR limit hit: {limit_name}")
+        self.limit_name = limit_name
+
+    def __reduce__(self) -> tuple[type, tuple[str]]:
+        # rebuilt from its arguments rather than its message when it's sent back from a worker process
+        return self.__class__, (self.limit_name,)
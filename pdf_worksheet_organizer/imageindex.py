@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import typing as t
+
+import pikepdf
+import fitz as pymupdf
+
+from pdf_worksheet_organizer.datatypes import MuImage
+
+
+class ImagePlacement(t.NamedTuple):
+    # position among the page's placements, in the order pymupdf lists them (starting at 1)
+    id: int
+    xref: int
+    bounding_box: pymupdf.Rect
+
+
+class ImageIndex:
+    # page -> placement -> xref, for every image drawn on a page.
+    # pikepdf opens what pymupdf saved, so an image's xref is also its pikepdf object number --
+    # which makes every lookup a direct one, no matter what the image is called in the page's resources.
+    # pages are only indexed when they're first asked for, so pages that weren't selected are never touched
+
+    def __init__(self, pike_pdf: pikepdf.Pdf, mu_pdf: pymupdf.Document) -> None:
+        self.pike_pdf = pike_pdf
+        self.mu_pdf = mu_pdf
+        self.pages: dict[int, list[ImagePlacement]] = {}
+        self.streams: dict[int, pikepdf.Stream] = {}
+
+    def placements(self, page_num: int) -> list[ImagePlacement]:
+        placements = self.pages.get(page_num)
+
+        if placements is None:
+            placements = self.index_page(page_num)
+            self.pages[page_num] = placements
+
+        return placements
+
+    def index_page(self, page_num: int) -> list[ImagePlacement]:
+        mu_page: pymupdf.Page = self.mu_pdf.load_page(page_num)
+        mu_images: list[MuImage] = mu_page.get_image_info(xrefs=True)  # type: ignore
+
+        placements: list[ImagePlacement] = []
+        for image_id, mu_image in enumerate(mu_images, start=1):
+            # inline images (xref 0) are part of the content stream itself, so there's no object to edit
+            if not mu_image["xref"]:
+                continue
+
+            placement = ImagePlacement(id=image_id, xref=mu_image["xref"], bounding_box=pymupdf.Rect(mu_image["bbox"]))
+            placements.append(placement)
+
+        return placements
+
+    def stream(self, xref: int) -> pikepdf.Stream:
+        stream = self.streams.get(xref)
+
+        if stream is None:
+            stream = t.cast(pikepdf.Stream, self.pike_pdf.get_object(xref, 0))
+            self.streams[xref] = stream
+
+        return stream
+
+
+def resource_path(pike_page: pikepdf.Page, xref: int) -> list[str] | None:
+    # the names an image is drawn by from the page -- only needed to swap in a copy of the image for this page.
+    # just the image's (first) name if it's in the page's own resources, otherwise the names of the form
+    # xobjects it's nested in, then its name in the innermost one. None if it can't be found at all
+    return xobject_path(pike_page.obj.Resources.get("/XObject"), xref, set())
+
+
+def xobject_path(xobjects: pikepdf.Dictionary | None, xref: int, seen_forms: set[int]) -> list[str] | None:
+    if xobjects is None:
+        return None
+
+    for name, xobject in xobjects.items():
+        if xobject.get("/Subtype") == pikepdf.Name.Image and xobject.objgen[0] == xref:
+            return [name]
+
+    for name, xobject in xobjects.items():
+        # forms can draw each other, so each is only looked in once
+        if xobject.get("/Subtype") != pikepdf.Name.Form or xobject.objgen[0] in seen_forms:
+            continue
+        seen_forms.add(xobject.objgen[0])
+
+        resources = xobject.get("/Resources")
+        path = xobject_path(resources.get("/XObject") if resources is not None else None, xref, seen_forms)
+        if path:
+            return [name, *path]
+
+    return None
+
+
+def image_xrefs(xobjects: pikepdf.Dictionary | None, seen_forms: set[int] | None = None) -> set[int]:
+    # every image drawn from `xobjects`, including the ones nested in form xobjects
+    if xobjects is None:
+        return set()
+
+    seen_forms = set() if seen_forms is None else seen_forms
+    xrefs: set[int] = set()
+
+    for xobject in xobjects.values():
+        if xobject.get("/Subtype") == pikepdf.Name.Image:
+            xrefs.add(xobject.objgen[0])
+        elif xobject.get("/Subtype") == pikepdf.Name.Form and xobject.objgen[0] not in seen_forms:
+            seen_forms.add(xobject.objgen[0])
+            resources = xobject.get("/Resources")
+            xrefs |= image_xrefs(resources.get("/XObject") if resources is not None else None, seen_forms)
+
+    return xrefs
+
+
+def placement_names(pike_pdf: pikepdf.Pdf, pike_page: pikepdf.Page, xrefs: list[int]) -> list[str] | None:
+    # the name each of the page's placements (given by xref, in order) is drawn by, so a copy can be swapped in
+    # for just one of them. an image drawn more than once by the same name gets a new name for every other
+    # placement. None if the page's `Do`s can't be lined up with its placements (e.g. some are in form xobjects)
+    images = {name: image.objgen[0] for name, image in pike_page.images.items()}
+    instructions = pikepdf.parse_content_stream(pike_page)
+
+    draws = [
+        index
+        for index, (operands, operator) in enumerate(instructions)
+        if operator == pikepdf.Operator("Do") and str(operands[0]) in images
+    ]
+    names = [str(instructions[index].operands[0]) for index in draws]
+
+    if [images[name] for name in names] != xrefs:
+        return None
+    if len(set(names)) == len(names):
+        return names
+
+    xobjects = own_xobjects(pike_page)
+    seen_names: set[str] = set()
+
+    for placement, index in enumerate(draws):
+        name = names[placement]
+        if name not in seen_names:
+            seen_names.add(name)
+            continue
+
+        new_name = f"{name}p{placement}"
+        while new_name in xobjects:
+            new_name += "_"
+
+        xobjects[new_name] = xobjects[name]
+        instructions[index] = pikepdf.ContentStreamInstruction([pikepdf.Name(new_name)], pikepdf.Operator("Do"))
+        names[placement] = new_name
+
+    pike_page.obj.Contents = pike_pdf.make_stream(pikepdf.unparse_content_stream(instructions))
+    return names
+
+
+def own_xobjects(pike_page: pikepdf.Page) -> pikepdf.Dictionary:
+    # the page's resources can be shared with other pages as well,
+    # so the page gets its own (shallow) copy of them before any of its xobjects are swapped out
+    resources = pikepdf.Dictionary(dict(pike_page.obj.Resources.items()))
+    xobjects = pikepdf.Dictionary(dict(resources.XObject.items()))
+    resources.XObject = xobjects
+    pike_page.obj.Resources = resources
+    return xobjects
+
+
+def own_form_xobjects(pike_pdf: pikepdf.Pdf, xobjects: pikepdf.Dictionary, form_name: str) -> pikepdf.Dictionary:
+    # same as `own_xobjects`, for a form xobject that's drawn by other pages as well:
+    # the form is copied (sharing its content stream's data), and the copy gets its own resources
+    form = xobjects[form_name]
+
+    form_copy = pikepdf.Stream(pike_pdf, form.read_raw_bytes())
+    for key, value in form.items():
+        if key != "/Length":
+            form_copy[key] = value
+
+    resources = pikepdf.Dictionary(dict(form.Resources.items()))
+    form_xobjects = pikepdf.Dictionary(dict(resources.XObject.items()))
+    resources.XObject = form_xobjects
+    form_copy.Resources = resources
+
+    xobjects[form_name] = form_copy
+    return form_xobjects
@@ -9,8 +9,8 @@ from PIL import ImageFont, Image, ImageDraw
 from pdf_worksheet_organizer.exceptions import NoAvailablePositionException
 
 
-def create_legend_image(numbers: list[int]) -> Image.Image:
-    new_number_to_number = list(enumerate(numbers, start=1))
+def create_legend_image(numbers: list[int], start_number: int = 1) -> Image.Image:
+    new_number_to_number = list(enumerate(numbers, start=start_number))
 
     gap = 4
     padding = 8
@@ -93,7 +93,7 @@ def create_legend_image(numbers: list[int]) -> Image.Image:
             + heading_height
             + heading_padding_bottom
             + padding
-            + ((new_number - 1) * (max_height + gap))
+            + ((new_number - start_number) * (max_height + gap))
         )
 
         draw.text((x, y), format_new_number(new_number), font=font, fill=black, spacing=0)
@@ -111,12 +111,13 @@ def add_legend(
     for page in numbered_pdf_file.pages:
         numbers.extend(el.number for el in page.elements)
 
-    legend_image = create_legend_image(numbers)
+    legend_image = create_legend_image(numbers, numbered_pdf_file.start_number)
 
-    mu_page: pymupdf.Page = mu_pdf.load_page(0)
+    # the legend goes on the first page that was renumbered
+    mu_page: pymupdf.Page = mu_pdf.load_page(pdf_file.page_numbers[0])
     page = pdf_file.pages[0]
 
-    position = find_position(mu_pdf[0], page, legend_image.size)
+    position = find_position(mu_page, page, legend_image.size)
 
     legend_image_bytes_io = io.BytesIO()
     legend_image.save(legend_image_bytes_io, format="png")
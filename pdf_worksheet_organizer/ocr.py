@@ -1,16 +1,304 @@
 from __future__ import annotations
 
+import io
+import time
+import bisect
+import asyncio
+import subprocess
+import collections
+from dataclasses import dataclass, field
+
+import pikepdf
 import pytesseract
+from PIL import Image
 
 import typing as t
 
 from pdf_worksheet_organizer.datatypes import OcrImageData
+from pdf_worksheet_organizer.exceptions import OcrLimitException
 
 if t.TYPE_CHECKING:
     from datatypes import PdfImage
 
+# white space between the images of a montage, so tesseract doesn't merge lines from different images
+MONTAGE_GAP = 32
+# images are split over several montages past this height
+MAX_MONTAGE_HEIGHT = 16_000
+
+OcrPolicy: t.TypeAlias = 't.Literal["skip", "downscale", "fail"]'
+OCR_POLICIES: tuple[OcrPolicy, ...] = ("skip", "downscale", "fail")
+
+
+@dataclass
+class OcrBudget:
+    # seconds tesseract gets for one image (or one montage, per image in it)
+    image_timeout: float | None = None
+    # images with more pixels than this are never decoded at full size
+    max_pixels: int | None = None
+    # seconds of ocr one document gets in total. parallel workers each get the whole budget
+    document_timeout: float | None = None
+    # what happens when a limit is hit:
+    # * "skip" -- the image is treated as having no question number
+    # * "downscale" -- big images are ocr'd scaled down (and timed out ones retried once at half size)
+    # * "fail" -- `OcrLimitException` is raised
+    policy: OcrPolicy = "downscale"
+
+    # how many times each limit was hit, by name ("image_timeout", "max_pixels", "document_timeout")
+    limits_hit: collections.Counter[str] = field(default_factory=collections.Counter)
+    # seconds of ocr used so far
+    spent: float = 0.0
+
+    def hit(self, limit: str) -> None:
+        self.limits_hit[limit] += 1
+        if self.policy == "fail":
+            raise OcrLimitException(limit)
+
+    def next_timeout(self, images: int = 1) -> float | None:
+        timeouts: list[float] = []
+        if self.image_timeout:
+            timeouts.append(self.image_timeout * images)
+        if self.document_timeout:
+            timeouts.append(self.document_timeout - self.spent)
+        return min(timeouts) if timeouts else None
+
+    def is_exhausted(self) -> bool:
+        return bool(self.document_timeout) and self.spent >= self.document_timeout  # type: ignore
+
+    def merge(self, other: OcrBudget) -> None:
+        self.limits_hit.update(other.limits_hit)
+        self.spent += other.spent
+
+
+def empty_image_data() -> OcrImageData:
+    # what a skipped image is ocr'd as -- no words, so no question number
+    return t.cast(OcrImageData, {key: [] for key in OcrImageData.__annotations__})
+
+
+def image_to_text(image: PdfImage, budget: OcrBudget | None = None) -> OcrImageData:
+    if budget:
+        return budgeted_image_to_text(image, budget)
 
-def image_to_text(image: PdfImage) -> OcrImageData:
     pil_image = image.as_pil_image()
     image_data: OcrImageData = pytesseract.image_to_data(pil_image, lang="eng", output_type=pytesseract.Output.DICT)
     return image_data
+
+
+def budgeted_image_to_text(image: PdfImage, budget: OcrBudget) -> OcrImageData:
+    if budget.is_exhausted():
+        budget.hit("document_timeout")
+        return empty_image_data()
+
+    loaded = load_pil_image(image, budget)
+    if not loaded:
+        return empty_image_data()
+
+    pil_image, scale = loaded
+    image_data = timed_image_to_data(pil_image, budget)
+
+    if image_data is None and budget.policy == "downscale" and not budget.is_exhausted():
+        # a smaller image is quicker to ocr, and the question number is usually big enough to survive it
+        pil_image = pil_image.reduce(2)
+        scale /= 2
+        image_data = timed_image_to_data(pil_image, budget)
+
+    if image_data is None:
+        return empty_image_data()
+
+    return scale_image_data(image_data, scale)
+
+
+def load_pil_image(image: PdfImage, budget: OcrBudget | None = None) -> tuple[Image.Image, float] | None:
+    # the decoded image, and how much it was scaled down to fit in the budget's pixel cap.
+    # None if the image is over the cap and gets skipped -- the cap is checked against the image's
+    # dictionary, so a skipped image is never decoded at all
+    if not budget or not budget.max_pixels:
+        return image.as_pil_image(), 1.0
+
+    width, height = image.size
+    if width * height <= budget.max_pixels:
+        return image.as_pil_image(), 1.0
+
+    budget.hit("max_pixels")
+    if budget.policy != "downscale":
+        return None
+
+    scale = (budget.max_pixels / (width * height)) ** 0.5
+    target_size = (max(round(width * scale), 1), max(round(height * scale), 1))
+
+    pil_image = draft_pil_image(image, target_size)
+    if pil_image.size != target_size:
+        pil_image = pil_image.resize(target_size)
+
+    return pil_image, scale
+
+
+def draft_pil_image(image: PdfImage, size: tuple[int, int]) -> Image.Image:
+    # jpegs are decoded at (close to, but not under) `size` instead of in full, which only works
+    # if the draft is set before the jpeg is loaded. any other image can only be decoded in full.
+    # `/Decode` remaps the jpeg's colors, which only pikepdf applies
+    stream = image.stream
+    if stream.get("/Filter") != pikepdf.Name.DCTDecode or "/Decode" in stream:
+        return image.as_pil_image()
+
+    pil_image = Image.open(io.BytesIO(stream.read_raw_bytes()))
+    pil_image.draft(pil_image.mode, size)
+    pil_image.load()
+    return pil_image
+
+
+def timed_image_to_data(pil_image: Image.Image, budget: OcrBudget, images: int = 1) -> OcrImageData | None:
+    # None if tesseract ran out of time
+    timeout = budget.next_timeout(images)
+    start = time.perf_counter()
+
+    try:
+        image_data: OcrImageData = pytesseract.image_to_data(
+            pil_image, lang="eng", output_type=pytesseract.Output.DICT, timeout=timeout or 0
+        )
+    except RuntimeError as error:
+        # pytesseract kills the tesseract process and raises a plain RuntimeError on timeouts
+        if str(error) != "Tesseract process timeout":
+            raise
+        budget.spent += time.perf_counter() - start
+        budget.hit("document_timeout" if budget.is_exhausted() else "image_timeout")
+        return None
+
+    budget.spent += time.perf_counter() - start
+    return image_data
+
+
+def scale_image_data(image_data: OcrImageData, scale: float) -> OcrImageData:
+    # ocr ran on a scaled down image, but the boxes have to be in the original image's pixels
+    if scale == 1.0:
+        return image_data
+
+    for key in ("left", "top", "width", "height"):
+        image_data[key] = [round(value / scale) for value in image_data[key]]  # type: ignore
+
+    return image_data
+
+
+def images_to_text(images: list[PdfImage], budget: OcrBudget | None = None) -> list[OcrImageData]:
+    # tesseract has a high fixed cost per call, so instead of one call per image, the images are
+    # stacked into one tall montage and every word found is mapped back to the image it came from
+    loaded_images = [load_pil_image(image, budget) for image in images]
+    pil_images = [loaded[0].convert("RGB") for loaded in loaded_images if loaded]
+
+    montage_images_data: list[OcrImageData] = []
+    for batch in batch_montage_images(pil_images):
+        montage_images_data.extend(montage_to_text(batch, budget))
+
+    # skipped images are left out of the montages, so their (empty) results are put back in here
+    montage_images_data.reverse()
+    images_data: list[OcrImageData] = []
+
+    for loaded in loaded_images:
+        if not loaded:
+            images_data.append(empty_image_data())
+            continue
+
+        images_data.append(scale_image_data(montage_images_data.pop(), loaded[1]))
+
+    return images_data
+
+
+def batch_montage_images(pil_images: list[Image.Image]) -> list[list[Image.Image]]:
+    batches: list[list[Image.Image]] = []
+    batch: list[Image.Image] = []
+    batch_height = 0
+
+    for pil_image in pil_images:
+        if batch and batch_height + pil_image.height > MAX_MONTAGE_HEIGHT:
+            batches.append(batch)
+            batch = []
+            batch_height = 0
+
+        batch.append(pil_image)
+        batch_height += pil_image.height + MONTAGE_GAP
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def montage_to_text(pil_images: list[Image.Image], budget: OcrBudget | None = None) -> list[OcrImageData]:
+    width = max(pil_image.width for pil_image in pil_images)
+    height = sum(pil_image.height + MONTAGE_GAP for pil_image in pil_images)
+    montage = Image.new("RGB", (width, height), (255, 255, 255))
+
+    # every image is pasted at the left edge, so only the top offset has to be kept
+    image_tops: list[int] = []
+    top = MONTAGE_GAP // 2
+    for pil_image in pil_images:
+        montage.paste(pil_image, (0, top))
+        image_tops.append(top)
+        top += pil_image.height + MONTAGE_GAP
+
+    montage_data: OcrImageData | None
+    if budget:
+        if budget.is_exhausted():
+            budget.hit("document_timeout")
+            return [empty_image_data() for _ in pil_images]
+        montage_data = timed_image_to_data(montage, budget, images=len(pil_images))
+    else:
+        montage_data = pytesseract.image_to_data(montage, lang="eng", output_type=pytesseract.Output.DICT)
+
+    if montage_data is None:
+        return [empty_image_data() for _ in pil_images]
+
+    images_data = [t.cast(OcrImageData, {key: [] for key in montage_data}) for _ in pil_images]
+
+    for index, word_top in enumerate(montage_data["top"]):
+        image_index = bisect.bisect_right(image_tops, word_top) - 1
+        if image_index < 0:
+            continue
+
+        local_top = word_top - image_tops[image_index]
+        # a box that runs past the bottom of its image is something like a whole-page block, not a word
+        if local_top + montage_data["height"][index] > pil_images[image_index].height:
+            continue
+
+        image_data = images_data[image_index]
+        for key, values in montage_data.items():
+            image_data[key].append(local_top if key == "top" else values[index])  # type: ignore
+
+    return images_data
+
+
+def image_to_png(image: PdfImage) -> bytes:
+    png_bytes_io = io.BytesIO()
+    image.as_pil_image().save(png_bytes_io, format="png")
+    return png_bytes_io.getvalue()
+
+
+async def png_to_text_async(png_bytes: bytes) -> OcrImageData:
+    # same invocation pytesseract uses for `image_to_data`, but piped through stdin/stdout
+    # so the event loop isn't blocked and no temp files are written
+    process = await asyncio.create_subprocess_exec(
+        pytesseract.pytesseract.tesseract_cmd,
+        "stdin",
+        "stdout",
+        "-l",
+        "eng",
+        "-c",
+        "tessedit_create_tsv=1",
+        "tsv",
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+    try:
+        stdout, stderr = await process.communicate(png_bytes)
+    except asyncio.CancelledError:
+        # don't leave tesseract running after the caller gave up on it
+        process.kill()
+        await process.wait()
+        raise
+
+    if process.returncode != 0:
+        raise pytesseract.TesseractError(process.returncode, stderr.decode(errors="replace"))
+
+    image_data: OcrImageData = pytesseract.pytesseract.file_to_dict(stdout.decode(errors="replace"), "\t", -1)
+    return image_data
@@ -1,5 +1,6 @@
-import io
-import pathlib
+from __future__ import annotations
+
+import typing as t
 
 import pikepdf
 import fitz as pymupdf
@@ -7,23 +8,24 @@ import fitz as pymupdf
 from pdf_worksheet_organizer.datatypes import (
     MuTextDict,
     PdfFont,
+    PdfFonts,
     PdfImage,
     PdfPage,
     PdfFile,
+    PdfNumberedFile,
     PdfWord,
+    QuestionMap,
     PdfText,
-    MuImage,
 )
-from pdf_worksheet_organizer import questions, renumber, legend
-
+from pdf_worksheet_organizer import digits, questions, questionmap, renumber, legend, parallel, pdfio
+from pdf_worksheet_organizer.pdfio import PdfSource
+from pdf_worksheet_organizer.imageindex import ImageIndex, ImagePlacement
+from pdf_worksheet_organizer.ocr import OcrBudget
+from pdf_worksheet_organizer.exceptions import PageSelectionException
 
-def image_name_as_int(image_name: str) -> int:
-    image_name = image_name.removeprefix("/")
-    image_name = image_name.removeprefix("Im")
-    image_name = image_name.removeprefix("age")
-    if not image_name.isdigit():
-        raise ValueError(f"Image name {image_name} is not a digit")
-    return int(image_name)
+# pages are numbered from 1, like in a print dialog -- either as ranges ("1-3,7,10-") or as a sequence of numbers.
+# only `PdfFile.page_numbers` and the like (which index the document) start at 0
+PageSelection: t.TypeAlias = "str | t.Sequence[int]"
 
 
 def parse_pdf_text(mu_page: pymupdf.Page) -> PdfText:
@@ -57,32 +59,14 @@ def parse_pdf_text(mu_page: pymupdf.Page) -> PdfText:
     return pdf_text
 
 
-def load_page(page_num: int, pike_pdf: pikepdf.Pdf, mu_pdf: pymupdf.Document) -> tuple[pikepdf.Page, pymupdf.Page]:
-    pike_page = pike_pdf.pages[page_num]
-    mu_page = mu_pdf.load_page(page_num)
-    return pike_page, mu_page
-
-
-def load_images(pike_page: pikepdf.Page, mu_page: pymupdf.Page) -> tuple[dict[int, pikepdf.Stream], list[MuImage]]:
-    pike_images = {image_name_as_int(k): v for k, v in pike_page.images.items()}
-    mu_images: list[MuImage] = mu_page.get_image_info(xrefs=True)  # type: ignore
-    return pike_images, mu_images
-
-
-def parse_pdf_images(
-    pike_images: dict[int, pikepdf.Stream],
-    mu_images: list[MuImage],
-) -> list[PdfImage]:
+def parse_pdf_images(placements: list[ImagePlacement], image_index: ImageIndex) -> list[PdfImage]:
     pdf_images: list[PdfImage] = []
 
-    for pike_image_id, mu_image in enumerate(mu_images, start=1):
-        image_dimensions = mu_image["bbox"]
-        image_stream = pike_images[pike_image_id]
-
+    for placement in placements:
         pdf_image = PdfImage(
-            id=pike_image_id,
-            stream=image_stream,
-            bounding_box=pymupdf.Rect(image_dimensions),
+            id=placement.id,
+            stream=image_index.stream(placement.xref),
+            bounding_box=placement.bounding_box,
         )
 
         pdf_images.append(pdf_image)
@@ -94,75 +78,180 @@ def parse_page(
     page_num: int,
     pike_pdf: pikepdf.Pdf,
     mu_pdf: pymupdf.Document,
+    image_index: ImageIndex | None = None,
 ) -> PdfPage:
-    pike_page, mu_page = load_page(page_num, pike_pdf, mu_pdf)
-    pike_images, mu_images = load_images(pike_page, mu_page)
+    if image_index is None:
+        image_index = ImageIndex(pike_pdf, mu_pdf)
 
-    pdf_images = parse_pdf_images(pike_images, mu_images)
+    mu_page: pymupdf.Page = mu_pdf.load_page(page_num)
+
+    pdf_images = parse_pdf_images(image_index.placements(page_num), image_index)
     pdf_text = parse_pdf_text(mu_page)
 
     pdf_page = PdfPage(images=pdf_images, text=pdf_text)
     return pdf_page
 
 
-def parse_pdf(pike_pdf: pikepdf.Pdf, mu_pdf: pymupdf.Document) -> PdfFile:
-    page_count = len(pike_pdf.pages)
+def parse_pdf(pike_pdf: pikepdf.Pdf, mu_pdf: pymupdf.Document, page_numbers: list[int] | None = None) -> PdfFile:
+    if page_numbers is None:
+        page_numbers = list(range(len(pike_pdf.pages)))
 
     pages: list[PdfPage] = []
+    # one index for the whole document, so an image shared between pages is only looked up once
+    image_index = ImageIndex(pike_pdf, mu_pdf)
 
-    for page_num in range(page_count):
-        page = parse_page(page_num, pike_pdf, mu_pdf)
+    # pages are loaded one at a time, so pages that weren't selected are never touched
+    for page_num in page_numbers:
+        page = parse_page(page_num, pike_pdf, mu_pdf, image_index)
         pages.append(page)
 
-    pdf_file = PdfFile(pages=pages)
+    pdf_file = PdfFile(pages=pages, page_numbers=page_numbers)
     return pdf_file
 
 
-def reorganize(pdf_path: pathlib.Path, add_legend: bool) -> tuple[pymupdf.Document, int]:
-    pike_pdf, mu_pdf = standardize_pdf(pdf_path)
+def select_pages(pages: PageSelection | None, page_count: int) -> list[int]:
+    # the selected pages' indexes in the document
+    if pages is None:
+        return list(range(page_count))
 
-    pdf_file = parse_pdf(pike_pdf, mu_pdf)
-    numbered_pdf_file = questions.parse_numbered_pdf(pdf_file)
+    if isinstance(pages, str):
+        page_numbers = parse_page_ranges(pages, page_count)
+    else:
+        page_numbers = {page - 1 for page in pages}
 
-    fonts = parse_pdf_fonts(mu_pdf)
-    final_pdf = renumber.renumber_pdf(pike_pdf, mu_pdf, pdf_file, numbered_pdf_file, fonts)
+    if not page_numbers or not all(0 <= page_num < page_count for page_num in page_numbers):
+        raise PageSelectionException(str(pages), page_count)
 
-    if add_legend:
-        final_pdf = legend.add_legend(final_pdf, pdf_file, numbered_pdf_file)
+    # always in document order, since questions are numbered in that order
+    return sorted(page_numbers)
 
-    return final_pdf, numbered_pdf_file.questions_count
 
+def parse_page_ranges(pages: str, page_count: int) -> set[int]:
+    page_numbers: set[int] = set()
 
-def standardize_pdf(pdf_path: pathlib.Path) -> tuple[pikepdf.Pdf, pymupdf.Document]:
-    mu_pdf = pymupdf.Document(pdf_path)
+    for page_range in pages.split(","):
+        start, dash, stop = page_range.strip().partition("-")
+        if not start and not dash:
+            raise PageSelectionException(pages, page_count)
 
-    # the `apply_redactions` function has the (undocumented) side effect of
-    # reordering all images from their original ids (which can be any number and in no specific order) 
-    # to an ordered 1, 2, 3, etc.
+        try:
+            first = int(start) if start else 1
+            last = (int(stop) if stop else page_count) if dash else first
+        except ValueError:
+            raise PageSelectionException(pages, page_count) from None
 
-    # this is a problem because each image's id is used to reference the image and is what allows us
-    # to modify each image. If these id's are changed, we can no longer reliably know which image is which.
+        if first < 1 or last < first:
+            raise PageSelectionException(pages, page_count)
 
-    # to avoid this, we allow this side effect to take place 
-    # before we parse the pdfs so the ids will remain consistent
+        page_numbers.update(range(first - 1, last))
 
-    mu_page: pymupdf.Page
-    for mu_page in mu_pdf.pages():
-        mu_page.add_redact_annot(quad=pymupdf.Rect(0, 0, 0, 0))
-        mu_page.apply_redactions(images=pymupdf.PDF_REDACT_IMAGE_NONE)  # type: ignore
+    return page_numbers
 
-    pdf_bytes_io = io.BytesIO()
-    mu_pdf.save(pdf_bytes_io)
 
-    pike_pdf = pikepdf.open(pdf_bytes_io)
+def reorganize(
+    source: PdfSource,
+    add_legend: bool,
+    workers: int = 1,
+    batch_ocr: bool = False,
+    pages: PageSelection | None = None,
+    start_number: int = 1,
+    digit_recognizer: bool = False,
+    ocr_budget: OcrBudget | None = None,
+) -> tuple[pymupdf.Document, int]:
+    # the limits `ocr_budget` hit are counted on it
+    pike_pdf, mu_pdf, page_numbers = open_pdf(source, pages)
+    pdf_file, numbered_pdf_file = detect_numbered_pdf(
+        pike_pdf, mu_pdf, page_numbers, workers, batch_ocr, digit_recognizer, ocr_budget
+    )
+    numbered_pdf_file = numbered_pdf_file._replace(start_number=start_number)
+
+    final_pdf = build_final_pdf(pike_pdf, mu_pdf, pdf_file, numbered_pdf_file, add_legend)
+    return final_pdf, numbered_pdf_file.questions_count
 
-    return pike_pdf, mu_pdf
 
+def detect_questions(
+    source: PdfSource,
+    workers: int = 1,
+    batch_ocr: bool = False,
+    pages: PageSelection | None = None,
+    start_number: int = 1,
+    digit_recognizer: bool = False,
+    ocr_budget: OcrBudget | None = None,
+) -> QuestionMap:
+    # stops right after detection -- nothing is renumbered or saved, and fonts are
+    # only loaded to render the digit recognizer's templates
+    pike_pdf, mu_pdf, page_numbers = open_pdf(source, pages)
+    pdf_file, numbered_pdf_file = detect_numbered_pdf(
+        pike_pdf, mu_pdf, page_numbers, workers, batch_ocr, digit_recognizer, ocr_budget
+    )
+    numbered_pdf_file = numbered_pdf_file._replace(start_number=start_number)
+    return questionmap.build_question_map(pdf_file, numbered_pdf_file)
+
+
+def reorganize_with_question_map(
+    source: PdfSource,
+    question_map: QuestionMap,
+    add_legend: bool,
+) -> tuple[pymupdf.Document, int]:
+    # image ids are positions in each page's placements, so they line up as long as the document's the same
+    pike_pdf, mu_pdf, page_numbers = open_pdf(source, questionmap.selected_pages(question_map))
+    pdf_file = parse_pdf(pike_pdf, mu_pdf, page_numbers)
+    numbered_pdf_file = questionmap.apply_question_map(pdf_file, question_map)
+
+    final_pdf = build_final_pdf(pike_pdf, mu_pdf, pdf_file, numbered_pdf_file, add_legend)
+    return final_pdf, numbered_pdf_file.questions_count
 
-def parse_pdf_fonts(mu_pdf: pymupdf.Document) -> list[PdfFont]:
-    mu_page: pymupdf.Page = mu_pdf.load_page(0)
 
-    # https://pymupdf.readthedocs.io/en/latest/document.html#Document.extract_font
+def detect_numbered_pdf(
+    pike_pdf: pikepdf.Pdf,
+    mu_pdf: pymupdf.Document,
+    page_numbers: list[int] | None = None,
+    workers: int = 1,
+    batch_ocr: bool = False,
+    digit_recognizer: bool = False,
+    ocr_budget: OcrBudget | None = None,
+) -> tuple[PdfFile, PdfNumberedFile]:
+    # workers = 0 means one per cpu core
+    if workers == 1:
+        pdf_file = parse_pdf(pike_pdf, mu_pdf, page_numbers)
+        recognizer = digits.DigitRecognizer(parse_pdf_fonts(mu_pdf)) if digit_recognizer else None
+        return pdf_file, questions.parse_numbered_pdf(pdf_file, batch_ocr, recognizer, ocr_budget)
+
+    return parallel.parse_numbered_pdf(
+        pike_pdf, mu_pdf, page_numbers, workers, batch_ocr, digit_recognizer, ocr_budget
+    )
+
+
+def build_final_pdf(
+    pike_pdf: pikepdf.Pdf,
+    mu_pdf: pymupdf.Document,
+    pdf_file: PdfFile,
+    numbered_pdf_file: PdfNumberedFile,
+    add_legend: bool,
+) -> pymupdf.Document:
+    fonts = parse_pdf_fonts(mu_pdf)
+    final_pdf = renumber.renumber_pdf(pike_pdf, mu_pdf, pdf_file, numbered_pdf_file, fonts)
+
+    if add_legend:
+        final_pdf = legend.add_legend(final_pdf, pdf_file, numbered_pdf_file)
+
+    return final_pdf
+
+
+def open_pdf(
+    source: PdfSource, pages: PageSelection | None = None
+) -> tuple[pikepdf.Pdf, pymupdf.Document, list[int]]:
+    # pikepdf opens what pymupdf saves, so both see the same object numbers -- which is all
+    # `ImageIndex` needs to find an image in either of them. nothing is rewritten beforehand
+    mu_pdf = pdfio.open_source(source)
+    page_numbers = select_pages(pages, mu_pdf.page_count)
+    pike_pdf = pdfio.mu_to_pike(mu_pdf)
+
+    return pike_pdf, mu_pdf, page_numbers
+
+
+def parse_pdf_fonts(mu_pdf: pymupdf.Document) -> PdfFonts:
+    # https://pymupdf.readthedocs.io/en/latest/document.html#Document.get_page_fonts
     # xref (int) is the font object number (may be zero if the PDF uses one of the builtin fonts directly)
     # ext (str) font file extension (e.g. “ttf”, see Font File Extensions)
     # type (str) is the font type (like “Type1” or “TrueType” etc.)
@@ -170,33 +259,34 @@ def parse_pdf_fonts(mu_pdf: pymupdf.Document) -> list[PdfFont]:
     # name (str) is the symbolic name, by which the font is referenced
     # encoding (str) the font’s character encoding if different from its built-in encoding (Adobe PDF References, p. 254):
     # referencer
-    mu_fonts: list[tuple[int, str, str, str, str, str, int]] = mu_page.get_fonts(full=True)
-    pdf_fonts: list[PdfFont] = []
-
-    for mu_font in mu_fonts:
-        xref = mu_font[0]
-        # (basename, ext, type, content)
-        mu_font_info: tuple[str, str, str, bytes] = mu_pdf.extract_font(xref=xref)
-        raw_bytes = mu_font_info[3]
-
-        # TODO: revisit this
-        # the problem here stems from the fact that if a font doesn't have a buffer with it
-        # then is it is annoying to work with
-        # for example, 'Times New Roman' won't have a buffer and its
-        # file is called 'times.ttf' so it's not super intuitive to find
-        if not raw_bytes:
-            continue
-
-        name = mu_font[3]
-        encoding = mu_font[5]
-        buffer = io.BytesIO(raw_bytes)
-
-        pdf_font = PdfFont(
-            name=name,
-            encoding=encoding,
-            buffer=buffer,
-        )
-
-        pdf_fonts.append(pdf_font)
+    pdf_fonts: PdfFonts = {}
+
+    # fonts are shared between pages, so they're keyed by xref to only be seen once.
+    # nothing is extracted here -- `PdfFont.buffer` does that lazily
+    for page_num in range(mu_pdf.page_count):
+        mu_fonts: list[tuple[int, str, str, str, str, str, int]] = mu_pdf.get_page_fonts(page_num, full=True)
+
+        for mu_font in mu_fonts:
+            xref = mu_font[0]
+
+            # TODO: revisit this
+            # the problem here stems from the fact that if a font doesn't have a buffer with it
+            # then is it is annoying to work with
+            # for example, 'Times New Roman' won't have a buffer and its
+            # file is called 'times.ttf' so it's not super intuitive to find
+            if not xref or xref in pdf_fonts:
+                continue
+
+            name = mu_font[3]
+            encoding = mu_font[5]
+
+            pdf_font = PdfFont(
+                xref=xref,
+                name=name,
+                encoding=encoding,
+                mu_pdf=mu_pdf,
+            )
+
+            pdf_fonts[xref] = pdf_font
 
     return pdf_fonts
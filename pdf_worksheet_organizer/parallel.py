@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import os
+import pathlib
+import dataclasses
+import collections
+import tempfile
+import concurrent.futures
+
+import pikepdf
+import fitz as pymupdf
+
+from pdf_worksheet_organizer import digits, organizer, questions
+from pdf_worksheet_organizer.ocr import OcrBudget
+from pdf_worksheet_organizer.imageindex import ImageIndex
+from pdf_worksheet_organizer.datatypes import (
+    ParsedImage,
+    ParsedPage,
+    PdfFile,
+    PdfImage,
+    PdfPage,
+    PdfNumberedFile,
+    PdfNumberedImage,
+    PdfNumberedPage,
+)
+
+# below this many pages per worker, spawning processes costs more than it saves
+MIN_PAGES_PER_WORKER = 4
+
+
+def parse_numbered_pdf(
+    pike_pdf: pikepdf.Pdf,
+    mu_pdf: pymupdf.Document,
+    page_numbers: list[int] | None = None,
+    workers: int | None = None,
+    batch_ocr: bool = False,
+    digit_recognizer: bool = False,
+    budget: OcrBudget | None = None,
+) -> tuple[PdfFile, PdfNumberedFile]:
+    if page_numbers is None:
+        page_numbers = list(range(len(pike_pdf.pages)))
+
+    page_count = len(page_numbers)
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, max(page_count // MIN_PAGES_PER_WORKER, 1))
+
+    if workers <= 1:
+        pdf_file = organizer.parse_pdf(pike_pdf, mu_pdf, page_numbers)
+        recognizer = digits.DigitRecognizer(organizer.parse_pdf_fonts(mu_pdf)) if digit_recognizer else None
+        return pdf_file, questions.parse_numbered_pdf(pdf_file, batch_ocr, recognizer, budget)
+
+    # the recognizer is only built in the workers, so a missing numpy is caught before any of them start
+    if digit_recognizer:
+        digits.require_numpy()
+
+    # each worker opens the document itself from a memory-mapped file
+    # instead of receiving a pickled copy of the whole pdf
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = pathlib.Path(temp_dir, "source.pdf")
+        # saved the same way as for `pike_pdf`, so image xrefs match its object numbers
+        mu_pdf.save(pdf_path)
+
+        # ranges of the selected pages, not of the document
+        page_ranges = split_page_ranges(page_count, workers)
+        worker_page_numbers = [page_numbers[page_range.start : page_range.stop] for page_range in page_ranges]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(parse_page_range, str(pdf_path), chunk, batch_ocr, digit_recognizer, budget)
+                for chunk in worker_page_numbers
+            ]
+
+            parsed_pages: list[ParsedPage] = []
+            for future in futures:
+                worker_parsed_pages, worker_budget = future.result()
+                parsed_pages.extend(worker_parsed_pages)
+                # each worker counts the limits it hit on its own copy of the budget
+                if budget and worker_budget:
+                    budget.merge(worker_budget)
+
+    return merge_parsed_pages(pike_pdf, mu_pdf, parsed_pages, page_numbers)
+
+
+def split_page_ranges(page_count: int, chunks: int) -> list[range]:
+    chunk_size, remainder = divmod(page_count, chunks)
+    page_ranges: list[range] = []
+
+    start = 0
+    for index in range(chunks):
+        stop = start + chunk_size + (index < remainder)
+        page_ranges.append(range(start, stop))
+        start = stop
+
+    return page_ranges
+
+
+def parse_page_range(
+    pdf_path: str,
+    page_numbers: list[int],
+    batch_ocr: bool = False,
+    digit_recognizer: bool = False,
+    budget: OcrBudget | None = None,
+) -> tuple[list[ParsedPage], OcrBudget | None]:
+    parsed_pages: list[ParsedPage] = []
+    # images shared between pages are only ocr'd once per worker
+    image_question_numbers: questions.ImageQuestionNumbers = {}
+    # only what this worker hits is sent back, so it can be added to the parent's counts
+    if budget:
+        budget = dataclasses.replace(budget, limits_hit=collections.Counter(), spent=0.0)
+
+    with pikepdf.open(pdf_path, access_mode=pikepdf.AccessMode.mmap) as pike_pdf, pymupdf.Document(pdf_path) as mu_pdf:
+        image_index = ImageIndex(pike_pdf, mu_pdf)
+        pages = [organizer.parse_page(page_num, pike_pdf, mu_pdf, image_index) for page_num in page_numbers]
+        # every worker renders its own templates, they're cheap next to pickling them over
+        recognizer = digits.DigitRecognizer(organizer.parse_pdf_fonts(mu_pdf)) if digit_recognizer else None
+
+        if batch_ocr:
+            questions.batch_parse_image_question_numbers(pages, image_question_numbers, recognizer, budget)
+
+        for page in pages:
+            numbered_images = questions.filter_numbered_images(
+                page.images, image_question_numbers, recognizer, budget
+            )
+            numbered_images_by_id = {image.id: image for image in numbered_images}
+
+            parsed_images: list[ParsedImage] = []
+            for image in page.images:
+                numbered_image = numbered_images_by_id.get(image.id)
+                parsed_image = ParsedImage(
+                    id=image.id,
+                    xref=image.xref,
+                    bounding_box=image.bounding_box,
+                    word=numbered_image.word if numbered_image else None,
+                    number_bounding_box=numbered_image.number_bounding_box if numbered_image else None,
+                )
+                parsed_images.append(parsed_image)
+
+            parsed_pages.append(ParsedPage(text=page.text, images=parsed_images))
+
+    return parsed_pages, budget
+
+
+def merge_parsed_pages(
+    pike_pdf: pikepdf.Pdf,
+    mu_pdf: pymupdf.Document,
+    parsed_pages: list[ParsedPage],
+    page_numbers: list[int],
+) -> tuple[PdfFile, PdfNumberedFile]:
+    pages: list[PdfPage] = []
+    numbered_pages: list[PdfNumberedPage] = []
+    # workers send back xrefs, which are looked up directly -- nothing on the page is indexed again
+    image_index = ImageIndex(pike_pdf, mu_pdf)
+
+    for parsed_page in parsed_pages:
+        pdf_images: list[PdfImage] = []
+        pdf_numbered_images: list[PdfNumberedImage] = []
+
+        for parsed_image in parsed_page.images:
+            image_stream = image_index.stream(parsed_image.xref)
+            pdf_image = PdfImage(id=parsed_image.id, stream=image_stream, bounding_box=parsed_image.bounding_box)
+            pdf_images.append(pdf_image)
+
+            if parsed_image.word is None or parsed_image.number_bounding_box is None:
+                continue
+
+            numbered_image = PdfNumberedImage(
+                id=parsed_image.id,
+                stream=image_stream,
+                bounding_box=parsed_image.bounding_box,
+                word=parsed_image.word,
+                number_bounding_box=parsed_image.number_bounding_box,
+            )
+            pdf_numbered_images.append(numbered_image)
+
+        pages.append(PdfPage(text=parsed_page.text, images=pdf_images))
+
+        # regex matching is cheap, so the text half of detection is redone here rather than pickling matches
+        numbered_page = questions.build_numbered_page(parsed_page.text, pdf_numbered_images)
+        numbered_pages.append(numbered_page)
+
+    return PdfFile(pages=pages, page_numbers=page_numbers), PdfNumberedFile(pages=numbered_pages)
@@ -1,23 +1,43 @@
 from __future__ import annotations
 
+import re
 import contextlib
 
 import fitz as pymupdf
 
-from pdf_worksheet_organizer.datatypes import PdfFont
+from pdf_worksheet_organizer.datatypes import PdfFonts
 
 from PIL import ImageFont
 
+FONT_NAME_SEPARATORS_REGEX = re.compile(r"[\s_-]")
 
-def fonts_pil_font(fonts: list[PdfFont], font_size: int) -> ImageFont._Font:
+
+def fonts_pil_font(fonts: PdfFonts, font_size: int) -> ImageFont._Font:
     pil_font: ImageFont._Font | None = None
-    for font in fonts:
+    for font in fonts.values():
+        if not font.buffer:
+            continue
         pil_font = font.as_pil_font(font_size)
         if pil_font:
             return pil_font
     return load_backup_font(font_size)
 
 
+def parse_font_from_fonts(font_name: str, fonts: PdfFonts) -> pymupdf.Font | None:
+    font_name = normalize_font_name(font_name)
+    for font in fonts.values():
+        if font_name in normalize_font_name(font.name) and font.buffer:
+            return font.as_pymupdf_font()
+    return None
+
+
+def normalize_font_name(font_name: str) -> str:
+    # the span's font name and the font dictionary's base font name don't always agree,
+    # e.g. "JetBrainsMono-Bold" vs "JetBrains Mono Bold", or "ABCDEF+Calibri" for subset fonts
+    font_name = font_name.split("+", 1)[-1]
+    return FONT_NAME_SEPARATORS_REGEX.sub("", font_name).lower()
+
+
 def load_backup_font(font_size: int) -> ImageFont._Font:
     attempt_to_load_fonts = [
         "Proxima Nova Font.otf",  # biased choice :)
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import io
+import os
+import mmap
+import typing as t
+
+import pikepdf
+import fitz as pymupdf
+
+# inputs at least this big are memory-mapped instead of read into memory
+MMAP_THRESHOLD = 16 * 1024 * 1024
+
+PdfSource: t.TypeAlias = "str | os.PathLike[str] | bytes | bytearray | memoryview | t.BinaryIO"
+PdfOutput: t.TypeAlias = "str | os.PathLike[str] | t.BinaryIO"
+
+# https://pymupdf.readthedocs.io/en/latest/document.html#Document.save
+# there's no profile that saves faster than "default": collecting less garbage leaves mupdf writing out
+# every replaced object (and compressing less leaves the new content streams raw), which is slower and bigger
+SAVE_PROFILES: dict[str, dict[str, t.Any]] = {
+    # full object de-duplication and recompression of every stream
+    "default": {"garbage": 3, "deflate": True},
+    # also de-duplicates identical streams, packs objects into object streams and compresses images & fonts
+    "compact": {
+        "garbage": 4,
+        "deflate": True,
+        "deflate_images": True,
+        "deflate_fonts": True,
+        "use_objstms": True,
+    },
+}
+
+
+# every buffer handed between pymupdf and pikepdf goes through here,
+# which keeps the number of whole-document copies in one place (and easy to measure)
+
+
+def open_source(source: PdfSource) -> pymupdf.Document:
+    if isinstance(source, (str, os.PathLike)):
+        if os.path.getsize(source) < MMAP_THRESHOLD:
+            return pymupdf.Document(source)
+        with open(source, "rb") as file:
+            return open_mmap(file)
+
+    # pymupdf reads bytes and memoryviews in place, so none of these are copied.
+    # the document holds on to the buffer for as long as it's open, so a bytearray can't be resized until then
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return pymupdf.Document(stream=memoryview(source))
+    # not `getbuffer`, which would keep the caller's BytesIO from being written to (or truncated) while the
+    # document is open. `getvalue` shares the BytesIO's bytes too, until the next write copies them
+    if isinstance(source, io.BytesIO):
+        return pymupdf.Document(stream=source.getvalue())
+
+    if is_real_file(source) and os.fstat(source.fileno()).st_size >= MMAP_THRESHOLD:
+        return open_mmap(source)
+    return pymupdf.Document(stream=source.read())
+
+
+def open_mmap(file: t.BinaryIO) -> pymupdf.Document:
+    # the document keeps a reference to the memoryview (and so the map) for as long as it's open
+    mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return pymupdf.Document(stream=memoryview(mapped_file))
+
+
+def is_real_file(source: t.BinaryIO) -> bool:
+    try:
+        source.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+    return True
+
+
+def mu_to_pike(mu_pdf: pymupdf.Document) -> pikepdf.Pdf:
+    # `BytesIO(bytes)` shares the buffer instead of copying it
+    pdf_bytes: bytes = mu_pdf.tobytes()
+    return pikepdf.open(io.BytesIO(pdf_bytes))
+
+
+def pike_to_mu(pike_pdf: pikepdf.Pdf) -> pymupdf.Document:
+    pdf_bytes_io = io.BytesIO()
+    pike_pdf.save(pdf_bytes_io)
+    # `getbuffer` is a view of the BytesIO, unlike `getvalue`
+    return pymupdf.Document(stream=pdf_bytes_io.getbuffer())
+
+
+def save_pdf(mu_pdf: pymupdf.Document, output: PdfOutput | None = None, profile: str = "default") -> bytes | None:
+    save_options = SAVE_PROFILES[profile]
+
+    if output is None:
+        pdf_bytes: bytes = mu_pdf.tobytes(**save_options)
+        return pdf_bytes
+
+    mu_pdf.save(output, **save_options)
+    return None
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import json
+import typing as t
+
+import fitz as pymupdf
+
+from pdf_worksheet_organizer import questions
+from pdf_worksheet_organizer.datatypes import (
+    PdfFile,
+    PdfPage,
+    PdfNumberedFile,
+    PdfNumberedImage,
+    PdfNumberedPage,
+    PdfNumberedWord,
+    QuestionMap,
+    QuestionMapElement,
+    QuestionMapPage,
+)
+from pdf_worksheet_organizer.exceptions import InvalidQuestionMapException, QuestionMapException
+
+QUESTION_MAP_VERSION = 2
+# version 1 maps numbered their pages from 0 and didn't have a start number
+SUPPORTED_VERSIONS = (1, 2)
+
+# what each json type is called in error messages
+JSON_TYPE_NAMES: dict[type, str] = {int: "an integer", str: "a string", list: "a list"}
+
+# how far (in points) a text element's bounding box may be from the word it's matched back to
+BOUNDING_BOX_TOLERANCE = 0.5
+
+
+def build_question_map(pdf_file: PdfFile, numbered_pdf_file: PdfNumberedFile) -> QuestionMap:
+    first_question_numbers = numbered_pdf_file.first_question_numbers
+    map_pages: list[QuestionMapPage] = []
+
+    for index, numbered_pdf_page in enumerate(numbered_pdf_file.pages):
+        page_num = pdf_file.page_numbers[index]
+        first_question_number = first_question_numbers[index]
+        map_elements: list[QuestionMapElement] = []
+
+        for new_number, element in enumerate(numbered_pdf_page.elements, start=first_question_number):
+            if isinstance(element, PdfNumberedWord):
+                map_element = QuestionMapElement(
+                    type="text",
+                    original_number=element.number,
+                    new_number=new_number,
+                    text=element.text,
+                    bounding_box=rect_as_tuple(element.bounding_box),
+                    image_id=None,
+                    number_bounding_box=None,
+                )
+            else:  # if isinstance(element, PdfNumberedImage):
+                map_element = QuestionMapElement(
+                    type="image",
+                    original_number=element.number,
+                    new_number=new_number,
+                    text=element.word,
+                    bounding_box=rect_as_tuple(element.bounding_box),
+                    image_id=element.id,
+                    number_bounding_box=rect_as_tuple(element.number_bounding_box),
+                )
+            map_elements.append(map_element)
+
+        map_pages.append(QuestionMapPage(page=page_num + 1, elements=map_elements))
+
+    return QuestionMap(
+        version=QUESTION_MAP_VERSION,
+        questions_count=numbered_pdf_file.questions_count,
+        start_number=numbered_pdf_file.start_number,
+        pages=map_pages,
+    )
+
+
+def apply_question_map(pdf_file: PdfFile, question_map: QuestionMap) -> PdfNumberedFile:
+    # rebuilds what detection would have found from a (possibly edited) map, without any ocr.
+    # new numbers always follow the order of the elements -- `new_number` is only there for previews,
+    # so dropping an element from the map is how a wrongly detected question is left alone
+    map_page_numbers = selected_pages(question_map)
+    numbered_pages: list[PdfNumberedPage] = []
+
+    for page_num, page, map_page_number, map_page in zip(
+        pdf_file.page_numbers, pdf_file.pages, map_page_numbers, question_map["pages"], strict=True
+    ):
+        if map_page_number != page_num + 1:
+            raise QuestionMapException(page_num, f"map has page {map_page_number} in its place")
+
+        elements = [map_element_to_numbered(page_num, page, map_element) for map_element in map_page["elements"]]
+        numbered_pages.append(PdfNumberedPage(elements=elements))
+
+    return PdfNumberedFile(pages=numbered_pages, start_number=question_map.get("start_number", 1))
+
+
+def selected_pages(question_map: QuestionMap) -> list[int]:
+    # the pages a map covers, numbered from 1 -- the same way `--pages` selects them
+    validate_question_map(question_map)
+
+    offset = 1 if question_map["version"] == 1 else 0
+    return [map_page["page"] + offset for map_page in question_map["pages"]]
+
+
+def map_element_to_numbered(
+    page_num: int, page: PdfPage, map_element: QuestionMapElement
+) -> PdfNumberedWord | PdfNumberedImage:
+    if map_element["type"] == "image":
+        image = next((image for image in page.images if image.id == map_element["image_id"]), None)
+        if not image or not map_element["number_bounding_box"]:
+            raise QuestionMapException(page_num, f"no image with id {map_element['image_id']}")
+
+        return questions.parse_numbered_image(
+            image, map_element["text"], pymupdf.Rect(map_element["number_bounding_box"])
+        )
+
+    bounding_box = pymupdf.Rect(map_element["bounding_box"])
+    for word in page.text:
+        if word.text != map_element["text"] or not rects_match(word.bounding_box, bounding_box):
+            continue
+
+        numbered_words = questions.filter_numbered_text([word])
+        if numbered_words:
+            return numbered_words[0]
+
+    raise QuestionMapException(page_num, f"no numbered text {map_element['text']!r}")
+
+
+def rects_match(first: pymupdf.Rect, second: pymupdf.Rect) -> bool:
+    return all(abs(a - b) <= BOUNDING_BOX_TOLERANCE for a, b in zip(first, second))
+
+
+def rect_as_tuple(rect: pymupdf.Rect) -> tuple[float, float, float, float]:
+    return (rect.x0, rect.y0, rect.x1, rect.y1)
+
+
+def dump_question_map(question_map: QuestionMap, file: t.TextIO) -> None:
+    json.dump(question_map, file, indent=2)
+
+
+def load_question_map(file: t.TextIO) -> QuestionMap:
+    try:
+        question_map: QuestionMap = json.load(file)
+    except json.JSONDecodeError as error:
+        raise InvalidQuestionMapException(f"not json ({error})") from None
+
+    validate_question_map(question_map)
+    return question_map
+
+
+def validate_question_map(question_map: t.Any) -> None:
+    # maps are meant to be edited by hand, so anything missing (or of the wrong type) is reported by name
+    # up front, instead of as a KeyError halfway through renumbering
+    if not isinstance(question_map, dict):
+        raise InvalidQuestionMapException("not a json object")
+
+    version = question_map.get("version")
+    if version not in SUPPORTED_VERSIONS:
+        raise InvalidQuestionMapException(f"unsupported version {version!r}")
+
+    check_field(question_map, "", "questions_count", int)
+    if version >= 2:
+        check_field(question_map, "", "start_number", int)
+    map_pages = check_field(question_map, "", "pages", list)
+
+    for page_index, map_page in enumerate(map_pages):
+        page_path = f"pages[{page_index}]"
+        if not isinstance(map_page, dict):
+            raise InvalidQuestionMapException(f"{page_path} isn't a json object")
+
+        check_field(map_page, page_path, "page", int)
+        map_elements = check_field(map_page, page_path, "elements", list)
+
+        for element_index, map_element in enumerate(map_elements):
+            validate_map_element(map_element, f"{page_path}.elements[{element_index}]")
+
+
+def validate_map_element(map_element: t.Any, path: str) -> None:
+    if not isinstance(map_element, dict):
+        raise InvalidQuestionMapException(f"{path} isn't a json object")
+
+    element_type = map_element.get("type")
+    if element_type not in ("text", "image"):
+        raise InvalidQuestionMapException(f"{path}.type is {element_type!r}, not 'text' or 'image'")
+
+    check_field(map_element, path, "original_number", int)
+    check_field(map_element, path, "new_number", int)
+    check_field(map_element, path, "text", str)
+    check_rect_field(map_element, path, "bounding_box")
+
+    if element_type == "image":
+        check_field(map_element, path, "image_id", int)
+        check_rect_field(map_element, path, "number_bounding_box")
+
+
+def check_field(parent: dict[str, t.Any], path: str, key: str, value_type: type) -> t.Any:
+    value = parent.get(key)
+    # bools are ints as far as isinstance is concerned
+    if not isinstance(value, value_type) or isinstance(value, bool):
+        field_path = f"{path}.{key}" if path else key
+        raise InvalidQuestionMapException(f"{field_path} should be {JSON_TYPE_NAMES[value_type]}, not {value!r}")
+    return value
+
+
+def check_rect_field(parent: dict[str, t.Any], path: str, key: str) -> None:
+    value = parent.get(key)
+    is_rect = (
+        isinstance(value, (list, tuple))
+        and len(value) == 4
+        and all(isinstance(coordinate, (int, float)) and not isinstance(coordinate, bool) for coordinate in value)
+    )
+    if not is_rect:
+        raise InvalidQuestionMapException(f"{path}.{key} should be [x0, y0, x1, y1], not {value!r}")
@@ -12,16 +12,31 @@ from pdf_worksheet_organizer.datatypes import PdfNumberedFile, PdfNumberedPage,
 
 
 if t.TYPE_CHECKING:
-    from datatypes import PdfFile, PdfPage, PdfText, PdfImages
+    from datatypes import PdfFile, PdfPage, PdfText, PdfImage, PdfImages, OcrImageData
+    from pdf_worksheet_organizer.digits import DigitRecognizer
+    from pdf_worksheet_organizer.ocr import OcrBudget
 
 NUMBERED_QUESTION_TEXT_REGEX = re.compile(r"(?:^| )(\d+[.)])(?=\s|$)")
 
+# ocr results keyed by image xref -- None if the image has no question number
+ImageQuestionNumbers: t.TypeAlias = "dict[int, tuple[str, pymupdf.Rect] | None]"
 
-def parse_numbered_pdf(pdf_file: PdfFile) -> PdfNumberedFile:
+
+def parse_numbered_pdf(
+    pdf_file: PdfFile,
+    batch_ocr: bool = False,
+    recognizer: DigitRecognizer | None = None,
+    budget: OcrBudget | None = None,
+) -> PdfNumberedFile:
     numbered_pages: list[PdfNumberedPage] = []
+    # shared between pages, so an image used on many pages (headers, question templates) is only ocr'd once
+    image_question_numbers: ImageQuestionNumbers = {}
+
+    if batch_ocr:
+        batch_parse_image_question_numbers(pdf_file.pages, image_question_numbers, recognizer, budget)
 
     for page in pdf_file.pages:
-        numbered_page = parse_numbered_page(page)
+        numbered_page = parse_numbered_page(page, image_question_numbers, recognizer, budget)
         numbered_pages.append(numbered_page)
 
     numbered_file = PdfNumberedFile(pages=numbered_pages)
@@ -49,9 +64,18 @@ def parse_numbered_elements(
     return pdf_numbered_els
 
 
-def parse_numbered_page(page: PdfPage) -> PdfNumberedPage:
-    pdf_numbered_text = filter_numbered_text(page.text)
-    pdf_numbered_images = filter_numbered_images(page.images)
+def parse_numbered_page(
+    page: PdfPage,
+    image_question_numbers: ImageQuestionNumbers | None = None,
+    recognizer: DigitRecognizer | None = None,
+    budget: OcrBudget | None = None,
+) -> PdfNumberedPage:
+    pdf_numbered_images = filter_numbered_images(page.images, image_question_numbers, recognizer, budget)
+    return build_numbered_page(page.text, pdf_numbered_images)
+
+
+def build_numbered_page(text: PdfText, pdf_numbered_images: list[PdfNumberedImage]) -> PdfNumberedPage:
+    pdf_numbered_text = filter_numbered_text(text)
 
     pdf_numbered_els = parse_numbered_elements(pdf_numbered_text, pdf_numbered_images)
     sort_by_bounding_box_top(pdf_numbered_els)
@@ -81,39 +105,103 @@ def filter_numbered_text(text: PdfText) -> list[PdfNumberedWord]:
     return matching_words
 
 
-def filter_numbered_images(images: PdfImages) -> list[PdfNumberedImage]:
+def filter_numbered_images(
+    images: PdfImages,
+    image_question_numbers: ImageQuestionNumbers | None = None,
+    recognizer: DigitRecognizer | None = None,
+    budget: OcrBudget | None = None,
+) -> list[PdfNumberedImage]:
     matching_images: list[PdfNumberedImage] = []
+    image_question_numbers = {} if image_question_numbers is None else image_question_numbers
 
     for image in images:
-        image_data = ocr.image_to_text(image)
+        if image.xref not in image_question_numbers:
+            image_question_numbers[image.xref] = find_image_question_number(image, recognizer, budget)
+
+        question_number = image_question_numbers[image.xref]
+        if question_number:
+            numbered_image = parse_numbered_image(image, *question_number)
+            matching_images.append(numbered_image)
+
+    return matching_images
 
-        # TODO: maybe add check to see if match is on left <25% of image
-        # (because thats where the question number is usually located)
 
-        for index, word in enumerate(image_data["text"]):
-            word = word.strip()
-            match = NUMBERED_QUESTION_TEXT_REGEX.search(word)
-            if not match:
+def find_image_question_number(
+    image: PdfImage, recognizer: DigitRecognizer | None = None, budget: OcrBudget | None = None
+) -> tuple[str, pymupdf.Rect] | None:
+    if recognizer and within_pixel_cap(image, budget):
+        recognition = recognizer.recognize(image.as_pil_image())
+        if recognition.confident:
+            return recognition.question_number
+
+    image_data = ocr.image_to_text(image, budget)
+    return find_question_number(image_data)
+
+
+def batch_parse_image_question_numbers(
+    pages: list[PdfPage],
+    image_question_numbers: ImageQuestionNumbers,
+    recognizer: DigitRecognizer | None = None,
+    budget: OcrBudget | None = None,
+) -> None:
+    # fills in `image_question_numbers` with a single (montage) ocr pass over all of the pages' images
+    images = {
+        image.xref: image for page in pages for image in page.images if image.xref not in image_question_numbers
+    }
+
+    # only the images the recognizer isn't sure about go in the montage
+    if recognizer:
+        for xref, image in list(images.items()):
+            if not within_pixel_cap(image, budget):
                 continue
-            left = image_data["left"][index]
-            top = image_data["top"][index]
-            right = image_data["width"][index] + left
-            bottom = image_data["height"][index] + top
-
-            number_bbox = pymupdf.Rect(left, top, right, bottom)
-            new_image = PdfNumberedImage(
-                id=image.id,
-                stream=image.stream,
-                bounding_box=image.bounding_box,
-                word=word,
-                number_bounding_box=number_bbox,
-            )
-            matching_images.append(new_image)
-
-            # only 1 match per image
-            break
 
-    return matching_images
+            recognition = recognizer.recognize(image.as_pil_image())
+            if recognition.confident:
+                image_question_numbers[xref] = recognition.question_number
+                del images[xref]
+
+    images_data = ocr.images_to_text(list(images.values()), budget)
+
+    for xref, image_data in zip(images, images_data):
+        image_question_numbers[xref] = find_question_number(image_data)
+
+
+def within_pixel_cap(image: PdfImage, budget: OcrBudget | None = None) -> bool:
+    # images over the cap are left to `ocr`, which decides (and counts) what happens to them
+    if not budget or not budget.max_pixels:
+        return True
+    width, height = image.size
+    return width * height <= budget.max_pixels
+
+
+def parse_numbered_image(image: PdfImage, word: str, number_bbox: pymupdf.Rect) -> PdfNumberedImage:
+    return PdfNumberedImage(
+        id=image.id,
+        stream=image.stream,
+        bounding_box=image.bounding_box,
+        word=word,
+        number_bounding_box=number_bbox,
+    )
+
+
+def find_question_number(image_data: OcrImageData) -> tuple[str, pymupdf.Rect] | None:
+    # TODO: maybe add check to see if match is on left <25% of image
+    # (because thats where the question number is usually located)
+
+    for index, word in enumerate(image_data["text"]):
+        word = word.strip()
+        match = NUMBERED_QUESTION_TEXT_REGEX.search(word)
+        if not match:
+            continue
+        left = image_data["left"][index]
+        top = image_data["top"][index]
+        right = image_data["width"][index] + left
+        bottom = image_data["height"][index] + top
+
+        # only 1 match per image
+        return word, pymupdf.Rect(left, top, right, bottom)
+
+    return None
 
 
 def sort_by_bounding_box_top(
@@ -1,21 +1,27 @@
 from __future__ import annotations
 
 import io
+import zlib
+import warnings
 import typing as t
+import collections
 import contextlib
+import concurrent.futures
 
 import pikepdf
 import fitz as pymupdf
-from PIL import ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont
 
 from pdf_worksheet_organizer.datatypes import (
     PdfFile,
-    PdfFont,
+    PdfFonts,
     PdfNumberedFile,
     PdfNumberedWord,
     PdfNumberedImage,
     PdfNumberedPage,
 )
+from pdf_worksheet_organizer import imageindex, pdfio
+from pdf_worksheet_organizer.embedding import FontEmbedder
 from pdf_worksheet_organizer.parsing import fonts_pil_font
 
 
@@ -27,65 +33,126 @@ def renumber_pdf(
     mu_pdf: pymupdf.Document,
     pdf_file: PdfFile,
     numbered_pdf_file: PdfNumberedFile,
-    fonts: list[PdfFont],
+    fonts: PdfFonts,
+    image_workers: int | None = None,
 ) -> pymupdf.Document:
-    question_number = 1
-    page_count = len(pdf_file.pages)
+    first_question_numbers = numbered_pdf_file.first_question_numbers
 
-    new_pike_pdf = pike_pdf
-    new_mu_pdf = mu_pdf
-    last_type: t.Type[PdfNumberedWord] | t.Type[PdfNumberedImage]
+    text_elements: list[tuple[int, int, PdfNumberedWord]] = []
+    image_elements: list[tuple[int, int, PdfNumberedImage]] = []
 
-    for page_num in range(page_count):
-        numbered_pdf_page = numbered_pdf_file.pages[page_num]
+    for index, page_num in enumerate(pdf_file.page_numbers):
+        numbered_pdf_page = numbered_pdf_file.pages[index]
+        first_question_number = first_question_numbers[index]
 
-        for element in numbered_pdf_page.elements:
+        for question_number, element in enumerate(numbered_pdf_page.elements, start=first_question_number):
             if isinstance(element, PdfNumberedWord):
-                mu_page: pymupdf.Page = new_mu_pdf.load_page(page_num)
-                renumber_text_element(question_number, fonts, mu_page, element)
-                last_type = PdfNumberedWord
+                text_elements.append((page_num, question_number, element))
             else:  # if isinstance(element, PdfNumberedImage):
-                pike_page = new_pike_pdf.pages[page_num]
-                renumber_image_element(question_number, fonts, pike_page, element)
-                last_type = PdfNumberedImage
+                image_elements.append((page_num, question_number, element))
+
+    # text and images are separate objects, so all of the text can be renumbered before any of the images.
+    # that way the document is only handed to pikepdf (and back) once, and all of the text is written
+    # by the same pymupdf document -- which embeds each replacement font once and shares it between pages
+
+    # pymupdf handles updating text
+    font_embedder = FontEmbedder(fonts)
+    for page_num, question_number, numbered_pdf_word in text_elements:
+        mu_page: pymupdf.Page = mu_pdf.load_page(page_num)
+        renumber_text_element(question_number, font_embedder, mu_page, numbered_pdf_word)
+
+    new_mu_pdf = mu_pdf
+    if image_elements:
+        new_pike_pdf = pike_pdf
+        if text_elements:
+            new_pike_pdf, _ = merge_pdfs(pike_pdf, mu_pdf, PdfNumberedWord)
+
+        new_mu_pdf = renumber_image_elements(new_pike_pdf, mu_pdf, pdf_file, fonts, image_elements, image_workers)
+
+    # only once everything is written -- the fonts the images are drawn with are extracted from `mu_pdf`
+    # on first use, and would only have the glyphs its text uses if it were subset before then
+    if text_elements:
+        font_embedder.subset_fonts(new_mu_pdf)
+
+    return new_mu_pdf
+
+
+def renumber_image_elements(
+    pike_pdf: pikepdf.Pdf,
+    mu_pdf: pymupdf.Document,
+    pdf_file: PdfFile,
+    fonts: PdfFonts,
+    image_elements: list[tuple[int, int, PdfNumberedImage]],
+    image_workers: int | None = None,
+) -> pymupdf.Document:
+    # an image placed more than once (e.g. the same question template on every page) is copied before
+    # it's renumbered, otherwise every placement would end up showing the last number written to it
+    image_uses = count_image_uses(pike_pdf, pdf_file)
+
+    # pikepdf handles updating images.
+    # everything pikepdf is needed for is read up front and written back at the end, since it (like pymupdf)
+    # can't be used from more than one thread. decoding, drawing and compressing in between is done on a
+    # thread pool -- zlib and most of pillow let go of the gil while they work
+    image_edits = [
+        prepare_image_edit(page_num, question_number, fonts, element, image_uses[element.xref] > 1)
+        for page_num, question_number, element in image_elements
+    ]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=image_workers) as executor:
+        images_data = list(executor.map(render_image_edit, image_edits))
+
+    # worked out before anything is copied, while every name still points at the image it was parsed as
+    image_keys = copied_placement_names(pike_pdf, pdf_file, image_edits)
 
-            new_pike_pdf, new_mu_pdf = merge_pdfs(new_pike_pdf, new_mu_pdf, last_type)
-            question_number += 1
+    for image_edit, image_data in zip(image_edits, images_data):
+        image_key = image_keys.get((image_edit.page_num, image_edit.element.id))
+        commit_image_edit(pike_pdf, image_edit, image_data, image_key)
 
+    _, new_mu_pdf = merge_pdfs(pike_pdf, mu_pdf, PdfNumberedImage)
     return new_mu_pdf
 
 
+def count_image_uses(pike_pdf: pikepdf.Pdf, pdf_file: PdfFile) -> collections.Counter[int]:
+    image_uses = collections.Counter(image.xref for page in pdf_file.pages for image in page.images)
+
+    # pages outside the selection aren't parsed, but an image they share still has to be copied before
+    # it's renumbered (forms they draw included). their resources are only looked up here -- none of their
+    # images are decoded
+    selected_page_numbers = set(pdf_file.page_numbers)
+    for page_num, pike_page in enumerate(pike_pdf.pages):
+        if page_num not in selected_page_numbers:
+            image_uses.update(imageindex.image_xrefs(pike_page.obj.Resources.get("/XObject")))
+
+    return image_uses
+
+
 def merge_pdfs(
     pike_pdf: pikepdf.Pdf, mu_pdf: pymupdf.Document, last_type: t.Type[PdfNumberedWord] | t.Type[PdfNumberedImage]
 ) -> tuple[pikepdf.Pdf, pymupdf.Document]:
     # sourcery skip: use-assigned-variable
-    pdf_bytes_io = io.BytesIO()
-
     new_pike_pdf = pike_pdf
     new_mu_pdf = mu_pdf
 
     # pymupdf handles updating text
     if last_type is PdfNumberedWord:
-        mu_pdf.save(pdf_bytes_io)
-        new_pike_pdf = pikepdf.open(pdf_bytes_io)
+        new_pike_pdf = pdfio.mu_to_pike(mu_pdf)
 
     # pikepdf handles updating images
     if last_type is PdfNumberedImage:
-        pike_pdf.save(pdf_bytes_io)
-        new_mu_pdf = pymupdf.Document(stream=pdf_bytes_io)
+        new_mu_pdf = pdfio.pike_to_mu(pike_pdf)
 
     return new_pike_pdf, new_mu_pdf
 
 
 def renumber_text_element(
     question_number: int,
-    fonts: list[PdfFont],
+    font_embedder: FontEmbedder,
     mu_page: pymupdf.Page,
     numbered_pdf_word: PdfNumberedWord,
 ) -> int:
     text_writer = pymupdf.TextWriter(mu_page.rect)
 
-    font = parse_font_from_fonts(numbered_pdf_word.font, fonts)
+    font = font_embedder.font_for(numbered_pdf_word.font)
 
     match = numbered_pdf_word.match
     question_number_text = QUESTION_NUMBER_FORMAT.format(question_number)
@@ -103,41 +170,193 @@ def renumber_text_element(
     return question_number
 
 
-def renumber_image_element(
+class ImageEdit(t.NamedTuple):
+    page_num: int
+    question_number: int
+    element: PdfNumberedImage
+    copy_on_write: bool
+    pil_font: ImageFont._Font
+    # the image's still encoded data if a thread can decode it without pikepdf, otherwise the decoded image
+    source: EncodedImage | Image.Image
+
+
+class EncodedImage(t.NamedTuple):
+    data: bytes
+    # "/FlateDecode" or "/DCTDecode"
+    filter: str
+    # only needed for flate, jpegs know their own
+    mode: str
+    size: tuple[int, int]
+
+
+def prepare_image_edit(
+    page_num: int,
     question_number: int,
-    fonts: list[PdfFont],
-    pike_page: pikepdf.Page,
+    fonts: PdfFonts,
     numbered_pdf_image: PdfNumberedImage,
-) -> None:
+    copy_on_write: bool,
+) -> ImageEdit:
     number_bbox = numbered_pdf_image.number_bounding_box
+    font_size = round((number_bbox.y1 - number_bbox.y0) * (3 / 2))
+    # loaded here, since the fonts are extracted from the pymupdf document on first use.
+    # each edit gets its own font object, so no two threads ever render with the same one
+    pil_font = fonts_pil_font(fonts, font_size)
+
+    source: EncodedImage | Image.Image = read_encoded_image(numbered_pdf_image) or numbered_pdf_image.as_pil_image()
+
+    return ImageEdit(
+        page_num=page_num,
+        question_number=question_number,
+        element=numbered_pdf_image,
+        copy_on_write=copy_on_write,
+        pil_font=pil_font,
+        source=source,
+    )
+
+
+def read_encoded_image(numbered_pdf_image: PdfNumberedImage) -> EncodedImage | None:
+    # the common cases (what pymupdf writes for inserted pngs, and jpegs) are simple enough to decode
+    # without pikepdf. anything else -- predictors, palettes, odd bit depths -- is decoded by pikepdf instead
+    stream = numbered_pdf_image.stream
+    stream_filter = stream.get("/Filter")
+    size = numbered_pdf_image.size
+
+    # `/Decode` remaps the image's colors (e.g. inverted jpegs), which is left to `PdfImage.as_pil_image`.
+    # the edited image is written back as displayed, without it
+    if "/Decode" in stream:
+        return None
+
+    if stream_filter == pikepdf.Name.DCTDecode:
+        return EncodedImage(data=stream.read_raw_bytes(), filter="/DCTDecode", mode="", size=size)
+
+    if stream_filter != pikepdf.Name.FlateDecode or "/DecodeParms" in stream:
+        return None
+    if stream.get("/BitsPerComponent") != 8:
+        return None
+
+    mode = colorspace_mode(stream.get("/ColorSpace"))
+    if not mode:
+        return None
+
+    return EncodedImage(data=stream.read_raw_bytes(), filter="/FlateDecode", mode=mode, size=size)
+
+
+def colorspace_mode(colorspace: t.Any) -> str | None:
+    if colorspace == pikepdf.Name.DeviceRGB:
+        return "RGB"
+    if colorspace == pikepdf.Name.DeviceGray:
+        return "L"
+
+    # icc based color spaces are [/ICCBased <profile stream>], and the profile says how many components there are
+    if isinstance(colorspace, pikepdf.Array) and len(colorspace) == 2 and colorspace[0] == pikepdf.Name.ICCBased:
+        return {1: "L", 3: "RGB"}.get(int(colorspace[1].get("/N", 0)))
+
+    return None
+
+
+def decode_image(source: EncodedImage | Image.Image) -> Image.Image:
+    if isinstance(source, Image.Image):
+        return source
+
+    if source.filter == "/DCTDecode":
+        pil_image = Image.open(io.BytesIO(source.data))
+        pil_image.load()
+        return pil_image
+
+    return Image.frombytes(source.mode, source.size, zlib.decompress(source.data))
+
+
+def render_image_edit(image_edit: ImageEdit) -> bytes:
+    # runs on the thread pool -- nothing in here may touch pikepdf or pymupdf
+    pil_image = decode_image(image_edit.source)
+
+    number_bbox = image_edit.element.number_bounding_box
     number_bbox_as_tuple: tuple[float, float, float, float] = tuple(number_bbox)  # type: ignore
 
-    pil_image = numbered_pdf_image.as_pil_image()
     # very top left pixel should be the proper background color in most scenarios
     # this can be changed to a different (more expensive) computation if need be.
-
-    font_size = round((number_bbox.y1 - number_bbox.y0) * (3 / 2))
-    pil_font = fonts_pil_font(fonts, font_size)
+    background_color = pil_image.getpixel((0, 0))
 
     xy: tuple[float, float] = tuple(number_bbox.top_left)  # type: ignore
-    text = QUESTION_NUMBER_FORMAT.format(question_number)
-
-    background_color = pil_image.getpixel((0, 0))
+    text = QUESTION_NUMBER_FORMAT.format(image_edit.question_number)
 
     draw = ImageDraw.Draw(pil_image)
     draw.rectangle(number_bbox_as_tuple, fill=background_color)
-    draw.text(xy, text=text, font=pil_font, fill=(0, 0, 0))
+    # a color name, so pillow works out black in the image's own mode -- (0, 0, 0) is only black for rgb
+    draw.text(xy, text=text, font=image_edit.pil_font, fill="black")
+
+    # compressed here rather than by pikepdf when it saves, which would do it one image at a time
+    return zlib.compress(pil_image.tobytes())
+
+
+def commit_image_edit(
+    pike_pdf: pikepdf.Pdf, image_edit: ImageEdit, image_data: bytes, image_key: str | None = None
+) -> None:
+    # images are found by xref, which is also their pikepdf object number -- even after the text pass,
+    # since handing the document to pikepdf keeps every object's number
+    xref = image_edit.element.xref
+
+    if not image_edit.copy_on_write:
+        image = pike_pdf.get_object(xref, 0)
+        image.write(image_data, filter=pikepdf.Name.FlateDecode)
+        # the edited image was decoded with `/Decode` already applied
+        if "/Decode" in image:
+            del image["/Decode"]
+        return
+
+    # only a copy needs the name the placement is drawn by, and the text pass may have renamed it.
+    # without `image_key` every placement of the image on this page shares one copy
+    pike_page = pike_pdf.pages[image_edit.page_num]
+    image_path = [image_key] if image_key else imageindex.resource_path(pike_page, xref)
+
+    if not image_path:
+        # e.g. drawn through resources the page inherits -- the other placements would all show this number,
+        # so this one's left as it was rather than giving up on the whole document
+        warnings.warn(
+            f"Could not find image with xref {xref} on page {image_edit.page_num + 1}, "
+            f"question {image_edit.question_number} is left unnumbered",
+            stacklevel=2,
+        )
+        return
+
+    write_image_copy(pike_pdf, pike_page, image_path, image_data)
 
-    raw_image = pil_image.tobytes()
 
-    image_id = numbered_pdf_image.id
-    str_image_id = str(image_id)
-    keys = [k for k in pike_page.images.keys() if str_image_id in k]
+def write_image_copy(pike_pdf: pikepdf.Pdf, pike_page: pikepdf.Page, image_path: list[str], image_data: bytes) -> None:
+    # an image drawn by a form xobject is copied along with the form (and any forms around that)
+    xobjects = imageindex.own_xobjects(pike_page)
+    for form_name in image_path[:-1]:
+        xobjects = imageindex.own_form_xobjects(pike_pdf, xobjects, form_name)
 
-    if not keys:
-        raise ValueError(f"Could not find image with id {numbered_pdf_image.id}")
+    image_key = image_path[-1]
+    shared_image = xobjects[image_key]
 
-    pike_page.images[keys[0]].write(raw_image)
+    # same as `Stream.write` -- the new data has its own encoding, so the old filters don't apply to it.
+    # nor does `/Decode`, which the edited image was decoded with
+    image_copy = pikepdf.Stream(pike_pdf, b"")
+    for key, value in shared_image.items():
+        if key not in ("/Filter", "/DecodeParms", "/Length", "/Decode"):
+            image_copy[key] = value
+    image_copy.write(image_data, filter=pikepdf.Name.FlateDecode)
+
+    xobjects[image_key] = image_copy
+
+
+def copied_placement_names(
+    pike_pdf: pikepdf.Pdf, pdf_file: PdfFile, image_edits: list[ImageEdit]
+) -> dict[tuple[int, int], str]:
+    # the name each placement on a page with copied images is drawn by, keyed by (page, image id)
+    image_keys: dict[tuple[int, int], str] = {}
+    pages = dict(zip(pdf_file.page_numbers, pdf_file.pages))
+
+    for page_num in sorted({image_edit.page_num for image_edit in image_edits if image_edit.copy_on_write}):
+        images = pages[page_num].images
+        names = imageindex.placement_names(pike_pdf, pike_pdf.pages[page_num], [image.xref for image in images])
+
+        if names:
+            image_keys.update({(page_num, image.id): name for image, name in zip(images, names)})
+
+    return image_keys
 
 
 def load_page(
@@ -151,13 +370,6 @@ def load_page(
     return (mu_page, numbered_pdf_page)
 
 
-def parse_font_from_fonts(font_name: str, fonts: list[PdfFont]) -> pymupdf.Font | None:
-    for font in fonts:
-        if font_name in font.name:
-            return font.as_pymupdf_font()
-    return None
-
-
 def load_backup_font(font_size: int) -> ImageFont._Font:
     attempt_to_load_fonts = [
         "Proxima Nova Font.otf",  # biased choice :)
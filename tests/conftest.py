@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import io
+import typing as t
+
+import pytest
+import pytesseract
+import fitz as pymupdf
+from PIL import Image, ImageDraw, ImageOps
+
+from pdf_worksheet_organizer.datatypes import OcrImageData
+
+# the fake ocr below reads a question number from the width of the first bar of ink in each line,
+# so a bar BAR_WIDTH * n pixels wide reads as "n."
+BAR_WIDTH = 4
+BAR_HEIGHT = 12
+BAR_LEFT = 10
+
+
+def numbered_image(question_number: int, size: tuple[int, int] = (200, 60), top: int = 10) -> Image.Image:
+    pil_image = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(pil_image)
+    right = BAR_LEFT + question_number * BAR_WIDTH
+    draw.rectangle((BAR_LEFT, top, right - 1, top + BAR_HEIGHT - 1), fill=(0, 0, 0))
+    return pil_image
+
+
+def image_bytes(pil_image: Image.Image) -> bytes:
+    png_bytes_io = io.BytesIO()
+    pil_image.save(png_bytes_io, format="png")
+    return png_bytes_io.getvalue()
+
+
+def worksheet(pages: list[list[int | str]], shared_image: int | None = None) -> bytes:
+    # each page is a list of questions: an int is an image question with that number,
+    # a str is a line of text. `shared_image` puts the same image question at the top of every page
+    mu_pdf = pymupdf.Document()
+    shared_xref = 0
+
+    for questions in pages:
+        mu_page: pymupdf.Page = mu_pdf.new_page()
+
+        if shared_image is not None:
+            rect = pymupdf.Rect(72, 20, 272, 80)
+            if shared_xref:
+                mu_page.insert_image(rect, xref=shared_xref)
+            else:
+                shared_xref = mu_page.insert_image(rect, stream=image_bytes(numbered_image(shared_image)))
+
+        for index, question in enumerate(questions):
+            y = 120 + index * 150
+            if isinstance(question, str):
+                mu_page.insert_text((72, y), question, fontsize=12)
+            else:
+                rect = pymupdf.Rect(72, y, 272, y + 60)
+                mu_page.insert_image(rect, stream=image_bytes(numbered_image(question)))
+
+    pdf_bytes: bytes = mu_pdf.tobytes()
+    return pdf_bytes
+
+
+def ink_lines(pil_image: Image.Image) -> list[tuple[int, int, int, int]]:
+    # (left, top, right, bottom) of the first bar of ink in each run of rows with ink in them
+    ink = ImageOps.invert(pil_image.convert("L")).point(lambda value: 255 if value > 128 else 0)
+    _, rows = ink.getprojection()
+
+    lines: list[tuple[int, int, int, int]] = []
+    top: int | None = None
+
+    for y, has_ink in enumerate([*rows, 0]):
+        if has_ink and top is None:
+            top = y
+        elif not has_ink and top is not None:
+            columns, _ = ink.crop((0, top, ink.width, y)).getprojection()
+            left = columns.index(1)
+            right = columns.index(0, left) if 0 in columns[left:] else len(columns)
+            lines.append((left, top, right, y))
+            top = None
+
+    return lines
+
+
+class FakeTesseract:
+    # stands in for `pytesseract.image_to_data`, and keeps track of how it was called
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[int, int]] = []
+        # images wider than this "time out"
+        self.slow_width: int | None = None
+
+    def __call__(self, pil_image: Image.Image, timeout: float = 0, **kwargs: t.Any) -> OcrImageData:
+        self.calls.append(pil_image.size)
+
+        if self.slow_width is not None and pil_image.width > self.slow_width:
+            raise RuntimeError("Tesseract process timeout")
+
+        image_data = t.cast(OcrImageData, {key: [] for key in OcrImageData.__annotations__})
+
+        # tesseract always starts with a box around the whole page
+        boxes = [("", (0, 0, pil_image.width, pil_image.height))]
+        for left, top, right, bottom in ink_lines(pil_image):
+            boxes.append((f"{round((right - left) / BAR_WIDTH)}.", (left, top, right, bottom)))
+
+        for level, (text, (left, top, right, bottom)) in enumerate(boxes, start=1):
+            for key, value in {
+                "level": min(level, 5),
+                "page_num": 1,
+                "block_num": 1,
+                "par_num": 1,
+                "line_num": 1,
+                "word_num": 1,
+                "left": left,
+                "top": top,
+                "width": right - left,
+                "height": bottom - top,
+                "conf": 95 if text else -1,
+                "text": text,
+            }.items():
+                image_data[key].append(value)  # type: ignore
+
+        return image_data
+
+
+@pytest.fixture
+def fake_tesseract(monkeypatch: pytest.MonkeyPatch) -> FakeTesseract:
+    fake = FakeTesseract()
+    monkeypatch.setattr(pytesseract, "image_to_data", fake)
+    return fake
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+import asyncio
+import pathlib
+import typing as t
+import concurrent.futures
+
+import pytest
+import pytesseract
+
+from pdf_worksheet_organizer import aio
+from tests.conftest import worksheet
+
+# stands in for the tesseract binary: logs its pid, sleeps for `sleep` seconds,
+# then reports a "7." at the top left of whatever image it was piped
+FAKE_TESSERACT = """\
+#!{python}
+import os, sys, time
+with open({log!r}, "a") as log:
+    log.write(f"{{os.getpid()}}\\n")
+sys.stdin.buffer.read()
+time.sleep({sleep})
+rows = [
+    "level\\tpage_num\\tblock_num\\tpar_num\\tline_num\\tword_num\\tleft\\ttop\\twidth\\theight\\tconf\\ttext",
+    "1\\t1\\t0\\t0\\t0\\t0\\t0\\t0\\t200\\t60\\t-1\\t",
+    "5\\t1\\t1\\t1\\t1\\t1\\t4\\t4\\t20\\t14\\t96.1\\t7.",
+]
+sys.stdout.write("\\n".join(rows) + "\\n")
+"""
+
+
+class FakeTesseractCommand:
+    def __init__(self, directory: pathlib.Path, sleep: float) -> None:
+        self.log_path = directory / "tesseract.log"
+        self.path = directory / "tesseract"
+        self.path.write_text(FAKE_TESSERACT.format(python=sys.executable, log=str(self.log_path), sleep=sleep))
+        self.path.chmod(0o755)
+
+    @property
+    def pids(self) -> list[int]:
+        return [int(line) for line in self.log_path.read_text().split()] if self.log_path.exists() else []
+
+
+@pytest.fixture
+def fake_tesseract_command(
+    request: pytest.FixtureRequest, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> FakeTesseractCommand:
+    command = FakeTesseractCommand(tmp_path, sleep=getattr(request, "param", 0))
+    monkeypatch.setattr(pytesseract.pytesseract, "tesseract_cmd", str(command.path))
+    return command
+
+
+@pytest.fixture
+def executor() -> t.Generator[concurrent.futures.Executor, None, None]:
+    # the stages don't touch tesseract, so a thread is enough (and sees the tests' monkeypatching)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        yield executor
+
+
+def is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_shared_image_is_ocrd_once(
+    fake_tesseract_command: FakeTesseractCommand, executor: concurrent.futures.Executor
+) -> None:
+    pdf_bytes = worksheet([[3], [5], ["1. text"]], shared_image=1)
+
+    final_pdf, questions_count = asyncio.run(aio.reorganize(pdf_bytes, False, executor=executor))
+
+    # the shared image and the two others, every one read as "7."
+    assert len(fake_tesseract_command.pids) == 3
+    assert questions_count == 6
+    assert final_pdf.page_count == 3
+
+
+@pytest.mark.parametrize("fake_tesseract_command", [30], indirect=True)
+def test_timeout_kills_tesseract(
+    fake_tesseract_command: FakeTesseractCommand, executor: concurrent.futures.Executor
+) -> None:
+    pdf_bytes = worksheet([[3], [5]])
+
+    start = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(aio.reorganize(pdf_bytes, False, timeout=1, executor=executor))
+
+    assert time.perf_counter() - start < 10
+    assert fake_tesseract_command.pids
+    assert not any(is_running(pid) for pid in fake_tesseract_command.pids)
+
+
+@pytest.mark.parametrize("fake_tesseract_command", [30], indirect=True)
+def test_cancel_kills_tesseract(
+    fake_tesseract_command: FakeTesseractCommand, executor: concurrent.futures.Executor
+) -> None:
+    async def cancel_once_ocr_started() -> None:
+        task = asyncio.ensure_future(aio.reorganize(worksheet([[3]]), False, executor=executor))
+        while not fake_tesseract_command.pids:
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(asyncio.wait_for(cancel_once_ocr_started(), 10))
+
+    assert not any(is_running(pid) for pid in fake_tesseract_command.pids)
+
+
+def test_running_stage_finishes_before_cleanup(
+    fake_tesseract_command: FakeTesseractCommand,
+    executor: concurrent.futures.Executor,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    parse_pages = aio.parse_pages
+    written: list[bool] = []
+
+    def slow_parse_pages(source: bytes, pdf_path: str, pages: object = None) -> object:
+        time.sleep(1)
+        # still writing into the temp directory after the caller gave up
+        result = parse_pages(source, pdf_path, pages)
+        written.append(os.path.exists(pdf_path))
+        return result
+
+    monkeypatch.setattr(aio, "parse_pages", slow_parse_pages)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(aio.reorganize(worksheet([[3]]), False, timeout=0.2, executor=executor))
+
+    assert written == [True]
+    assert fake_tesseract_command.pids == []
+
+
+def test_stream_source(fake_tesseract_command: FakeTesseractCommand, executor: concurrent.futures.Executor) -> None:
+    pdf_path = fake_tesseract_command.path.parent / "source.pdf"
+    pdf_path.write_bytes(worksheet([["3. text"]]))
+
+    with open(pdf_path, "rb") as file:
+        final_pdf, questions_count = asyncio.run(aio.reorganize(file, False, executor=executor))
+
+    assert questions_count == 1
+    assert "1) text" in final_pdf.load_page(0).get_text()
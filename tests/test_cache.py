@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import os
+import time
+import pathlib
+
+import pytest
+
+from pdf_worksheet_organizer import cache
+from pdf_worksheet_organizer.ocr import OcrBudget
+from tests.conftest import FakeTesseract, worksheet
+
+
+def test_hit_and_miss(tmp_path: pathlib.Path, fake_tesseract: FakeTesseract) -> None:
+    result_cache = cache.ResultCache(tmp_path)
+    pdf_bytes = worksheet([["1. first", 3]])
+
+    result = cache.reorganize(pdf_bytes, result_cache, add_legend=False)
+    calls = len(fake_tesseract.calls)
+
+    assert result[1] == 2
+    assert cache.reorganize(pdf_bytes, result_cache, add_legend=False) == result
+    assert len(fake_tesseract.calls) == calls
+
+    # any other option is another result
+    other_result = cache.reorganize(pdf_bytes, result_cache, add_legend=False, start_number=4)
+    assert other_result != result
+    assert len(fake_tesseract.calls) == 2 * calls
+    assert len(list(tmp_path.glob("*.pdf"))) == 2
+
+
+def test_source_kinds_share_entries(tmp_path: pathlib.Path, fake_tesseract: FakeTesseract) -> None:
+    result_cache = cache.ResultCache(tmp_path)
+    pdf_path = tmp_path / "worksheet.pdf"
+    pdf_path.write_bytes(worksheet([["1. first"]]))
+
+    result = cache.reorganize(pdf_path, result_cache, add_legend=False)
+    with open(pdf_path, "rb") as stream:
+        assert cache.reorganize(stream, result_cache, add_legend=False) == result
+    assert len(list(tmp_path.glob("*.pdf"))) == 2  # the source and one entry
+
+
+def test_least_recently_used_are_evicted(tmp_path: pathlib.Path) -> None:
+    result_cache = cache.ResultCache(tmp_path, max_size=250)
+
+    for key in "abc":
+        result_cache.put(key, b"x" * 100, 1)
+        entry_path = result_cache.entry_path(key)
+        # mtimes can be too coarse to tell entries written one after another apart
+        os.utime(entry_path, (time.time() - 100 + ord(key), time.time() - 100 + ord(key)))
+
+    assert result_cache.get("a") is None
+    assert result_cache.get("b") == (b"x" * 100, 1)
+
+    # "b" was just used, so "c" goes first
+    result_cache.put("d", b"x" * 100, 1)
+    assert result_cache.get("c") is None
+    assert result_cache.get("b") is not None
+    assert result_cache.get("d") is not None
+
+
+def test_stale_temp_files_are_removed(tmp_path: pathlib.Path) -> None:
+    result_cache = cache.ResultCache(tmp_path)
+    stale_path = tmp_path / "stale.tmp"
+    fresh_path = tmp_path / "fresh.tmp"
+    stale_path.write_bytes(b"x")
+    fresh_path.write_bytes(b"x")
+    stale_time = time.time() - cache.STALE_TEMP_AGE - 1
+    os.utime(stale_path, (stale_time, stale_time))
+
+    result_cache.put("a", b"x", 1)
+
+    assert not stale_path.exists()
+    assert fresh_path.exists()
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    result_cache = cache.ResultCache(tmp_path)
+
+    def fail_replace(source: str, destination: str) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail_replace)
+    with pytest.raises(OSError, match="disk full"):
+        result_cache.put("a", b"x", 1)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_limited_result_is_not_stored(tmp_path: pathlib.Path, fake_tesseract: FakeTesseract) -> None:
+    result_cache = cache.ResultCache(tmp_path)
+    pdf_bytes = worksheet([[3]])
+    fake_tesseract.slow_width = 0
+
+    ocr_budget = OcrBudget(policy="skip")
+    _, questions_count = cache.reorganize(pdf_bytes, result_cache, add_legend=False, ocr_budget=ocr_budget)
+
+    assert questions_count == 0
+    assert ocr_budget.limits_hit
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import pytest
+import fitz as pymupdf
+from PIL import Image, ImageDraw, ImageFont
+
+pytest.importorskip("numpy")
+
+from pdf_worksheet_organizer import digits, organizer  # noqa: E402
+from tests.conftest import FakeTesseract, image_bytes, numbered_image  # noqa: E402
+
+
+def test_number_is_recognized() -> None:
+    pil_image = Image.new("RGB", (300, 80), (255, 255, 255))
+    font = ImageFont.truetype(font=str(digits.BUNDLED_FONT_PATH), size=32)
+    ImageDraw.Draw(pil_image).text((8, 20), "12.  a question", font=font, fill=(0, 0, 0))
+
+    recognition = digits.DigitRecognizer({}).recognize(pil_image)
+
+    assert recognition.confident
+    assert recognition.question_number is not None
+    assert recognition.question_number[0] == "12."
+
+
+def test_blank_margin_is_not_confident() -> None:
+    # too faint for the recognizer, but not for tesseract
+    pil_image = Image.new("RGB", (200, 60), (255, 255, 255))
+    ImageDraw.Draw(pil_image).rectangle((10, 10, 21, 21), fill=(192, 192, 192))
+
+    recognition = digits.DigitRecognizer({}).recognize(pil_image)
+    assert recognition.question_number is None
+    assert not recognition.confident
+
+
+def test_recognizer_falls_back_to_tesseract(fake_tesseract: FakeTesseract) -> None:
+    mu_pdf = pymupdf.Document()
+    mu_page = mu_pdf.new_page()
+    # the bar isn't a digit, so only (fake) tesseract can read it
+    mu_page.insert_image(pymupdf.Rect(72, 120, 272, 180), stream=image_bytes(numbered_image(3)))
+
+    _, questions_count = organizer.reorganize(mu_pdf.tobytes(), add_legend=False, digit_recognizer=True)
+
+    assert questions_count == 1
+    assert fake_tesseract.calls
+
+
+def text_image(*lines: str) -> Image.Image:
+    pil_image = Image.new("RGB", (300, 100), (255, 255, 255))
+    font = ImageFont.truetype(font=str(digits.BUNDLED_FONT_PATH), size=16)
+    draw = ImageDraw.Draw(pil_image)
+    for index, line in enumerate(lines):
+        draw.text((8, 8 + index * 24), line, font=font, fill=(0, 0, 0))
+    return pil_image
+
+
+@pytest.mark.parametrize(
+    "lines",
+    [
+        # a bare number isn't a question number
+        ("1 Solve for x",),
+        # but there's one below the header, which only tesseract reads
+        ("1I", "3. Solve for x"),
+    ],
+)
+@pytest.mark.parametrize("batch_ocr", [False, True])
+def test_no_question_number_goes_to_tesseract(
+    fake_tesseract: FakeTesseract, lines: tuple[str, ...], batch_ocr: bool
+) -> None:
+    pil_image = text_image(*lines)
+    assert not digits.DigitRecognizer({}).recognize(pil_image).confident
+
+    mu_pdf = pymupdf.Document()
+    mu_page = mu_pdf.new_page()
+    mu_page.insert_image(pymupdf.Rect(72, 120, 372, 220), stream=image_bytes(pil_image))
+
+    organizer.reorganize(mu_pdf.tobytes(), add_legend=False, batch_ocr=batch_ocr, digit_recognizer=True)
+
+    assert len(fake_tesseract.calls) == 1
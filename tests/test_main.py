@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import pathlib
+
+import pytest
+from click.testing import CliRunner
+
+from pdf_worksheet_organizer import organizer, questionmap
+from pdf_worksheet_organizer.__main__ import organize
+from tests.conftest import FakeTesseract, worksheet
+
+
+@pytest.fixture
+def question_map_path(fake_tesseract: FakeTesseract, tmp_path: pathlib.Path) -> pathlib.Path:
+    pdf_path = tmp_path / "worksheet.pdf"
+    pdf_path.write_bytes(worksheet([["3. first"], ["5. second"]]))
+
+    map_path = tmp_path / "worksheet-questions.json"
+    with map_path.open("w") as file:
+        questionmap.dump_question_map(organizer.detect_questions(pdf_path), file)
+
+    return map_path
+
+
+@pytest.mark.parametrize(
+    ("option", "value"), [("--pages", "1"), ("--start-number", "1"), ("--cache-dir", "cache"), ("--detect-only", None)]
+)
+def test_options_conflicting_with_question_map(
+    question_map_path: pathlib.Path, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch, option: str, value: str | None
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    args = [str(tmp_path / "worksheet.pdf"), "output.pdf", "--question-map", str(question_map_path), option]
+
+    result = CliRunner().invoke(organize, args if value is None else [*args, value])
+
+    assert result.exit_code == 2
+    assert f"{option} and --question-map can't be used together" in result.output
+    assert not (tmp_path / "output.pdf").exists()
+
+
+def test_question_map(question_map_path: pathlib.Path, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    args = [str(tmp_path / "worksheet.pdf"), "output.pdf", "--question-map", str(question_map_path)]
+
+    result = CliRunner().invoke(organize, args)
+
+    assert result.exit_code == 0, result.output
+    assert "2 questions" in result.output
+    assert (tmp_path / "output.pdf").exists()
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import io
+import typing as t
+
+import pytest
+import pikepdf
+import fitz as pymupdf
+from PIL import Image
+
+from pdf_worksheet_organizer import ocr, questions
+from pdf_worksheet_organizer.datatypes import OcrImageData, PdfImage
+from pdf_worksheet_organizer.exceptions import OcrLimitException
+from tests.conftest import BAR_HEIGHT, BAR_LEFT, BAR_WIDTH, FakeTesseract, numbered_image
+
+
+def words(image_data: OcrImageData) -> list[tuple[str, int, int]]:
+    return [
+        (text, left, top)
+        for text, left, top in zip(image_data["text"], image_data["left"], image_data["top"])
+        if text
+    ]
+
+
+def test_montage_maps_words_back_to_their_image(fake_tesseract: FakeTesseract) -> None:
+    pil_images = [
+        numbered_image(3, size=(200, 60), top=10),
+        # nothing to read in this one
+        Image.new("RGB", (300, 40), (255, 255, 255)),
+        numbered_image(12, size=(120, 90), top=50),
+    ]
+
+    images_data = ocr.montage_to_text(pil_images)
+
+    assert len(fake_tesseract.calls) == 1
+    assert [words(image_data) for image_data in images_data] == [
+        [("3.", BAR_LEFT, 10)],
+        [],
+        [("12.", BAR_LEFT, 50)],
+    ]
+    # tesseract's box around the whole montage doesn't belong to any one image
+    assert all(height <= BAR_HEIGHT for image_data in images_data for height in image_data["height"])
+
+
+def test_montages_are_split_by_height(fake_tesseract: FakeTesseract, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(ocr, "MAX_MONTAGE_HEIGHT", 200)
+    pil_images = [numbered_image(question_number) for question_number in range(1, 8)]
+
+    batches = ocr.batch_montage_images(pil_images)
+    images_data = [image_data for batch in batches for image_data in ocr.montage_to_text(batch)]
+
+    assert len(batches) > 1
+    assert all(sum(pil_image.height + ocr.MONTAGE_GAP for pil_image in batch) <= 200 for batch in batches)
+    assert len(fake_tesseract.calls) == len(batches)
+    assert [words(image_data)[0][0] for image_data in images_data] == [f"{number}." for number in range(1, 8)]
+
+
+def test_found_question_number_is_in_image_pixels(fake_tesseract: FakeTesseract) -> None:
+    images_data = ocr.montage_to_text([numbered_image(2), numbered_image(4, top=30)])
+
+    question_number = questions.find_question_number(images_data[1])
+
+    assert question_number is not None
+    word, number_bbox = question_number
+    assert word == "4."
+    assert tuple(number_bbox) == (BAR_LEFT, 30, BAR_LEFT + 16, 30 + BAR_HEIGHT)
+
+
+@pytest.fixture
+def pdf_image(request: pytest.FixtureRequest) -> t.Generator[PdfImage, None, None]:
+    # a 400x120 image with a 40 pixel wide bar at (BAR_LEFT, 20), saved as `request.param` ("png" or "jpeg")
+    image_bytes_io = io.BytesIO()
+    numbered_image(10, size=(400, 120), top=20).save(image_bytes_io, format=getattr(request, "param", "png"))
+
+    mu_pdf = pymupdf.Document()
+    mu_page: pymupdf.Page = mu_pdf.new_page()
+    mu_page.insert_image(pymupdf.Rect(72, 72, 472, 192), stream=image_bytes_io.getvalue())
+
+    with pikepdf.open(io.BytesIO(mu_pdf.tobytes())) as pike_pdf:
+        stream = next(iter(pike_pdf.pages[0].images.values()))
+        yield PdfImage(id=1, stream=stream, bounding_box=pymupdf.Rect(72, 72, 472, 192))
+
+
+def no_full_decode(monkeypatch: pytest.MonkeyPatch) -> None:
+    def as_pil_image(self: PdfImage) -> Image.Image:
+        raise AssertionError("decoded in full")
+
+    monkeypatch.setattr(PdfImage, "as_pil_image", as_pil_image)
+
+
+def test_oversized_image_is_skipped_without_decoding(
+    fake_tesseract: FakeTesseract, pdf_image: PdfImage, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    no_full_decode(monkeypatch)
+    budget = ocr.OcrBudget(max_pixels=400 * 120 - 1, policy="skip")
+
+    assert words(ocr.image_to_text(pdf_image, budget)) == []
+    assert fake_tesseract.calls == []
+    assert budget.limits_hit == {"max_pixels": 1}
+
+
+@pytest.mark.parametrize("pdf_image", ["png", "jpeg"], indirect=True)
+def test_oversized_image_is_downscaled(fake_tesseract: FakeTesseract, pdf_image: PdfImage) -> None:
+    budget = ocr.OcrBudget(max_pixels=200 * 60)
+
+    image_data = ocr.image_to_text(pdf_image, budget)
+
+    assert fake_tesseract.calls == [(200, 60)]
+    assert budget.limits_hit == {"max_pixels": 1}
+    # the boxes are in the full size image's pixels
+    [(_, left, top)] = words(image_data)
+    assert (left, top) == (BAR_LEFT, 20)
+    assert abs(image_data["width"][-1] - 10 * BAR_WIDTH) <= 2
+
+
+@pytest.mark.parametrize("pdf_image", ["jpeg"], indirect=True)
+def test_oversized_jpeg_is_decoded_in_draft(
+    fake_tesseract: FakeTesseract, pdf_image: PdfImage, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    no_full_decode(monkeypatch)
+    pil_image = ocr.draft_pil_image(pdf_image, (100, 30))
+
+    # jpegs are decoded at a power of two scale, as close as it gets without going under
+    assert pil_image.size == (100, 30)
+
+    ocr.image_to_text(pdf_image, ocr.OcrBudget(max_pixels=200 * 60))
+    assert fake_tesseract.calls == [(200, 60)]
+
+
+def test_timed_out_image_is_retried_at_half_size(fake_tesseract: FakeTesseract, pdf_image: PdfImage) -> None:
+    fake_tesseract.slow_width = 300
+    budget = ocr.OcrBudget(image_timeout=1)
+
+    image_data = ocr.image_to_text(pdf_image, budget)
+
+    assert fake_tesseract.calls == [(400, 120), (200, 60)]
+    assert budget.limits_hit == {"image_timeout": 1}
+    [(_, left, top)] = words(image_data)
+    assert (left, top) == (BAR_LEFT, 20)
+
+
+def test_timed_out_image_is_skipped(fake_tesseract: FakeTesseract, pdf_image: PdfImage) -> None:
+    fake_tesseract.slow_width = 300
+    budget = ocr.OcrBudget(image_timeout=1, policy="skip")
+
+    assert words(ocr.image_to_text(pdf_image, budget)) == []
+    assert fake_tesseract.calls == [(400, 120)]
+    assert budget.limits_hit == {"image_timeout": 1}
+
+
+@pytest.mark.parametrize(
+    ("budget", "slow_width", "limit"),
+    [
+        (ocr.OcrBudget(max_pixels=200 * 60, policy="fail"), None, "max_pixels"),
+        (ocr.OcrBudget(image_timeout=1, policy="fail"), 300, "image_timeout"),
+    ],
+)
+def test_limit_fails(
+    fake_tesseract: FakeTesseract, pdf_image: PdfImage, budget: ocr.OcrBudget, slow_width: int | None, limit: str
+) -> None:
+    fake_tesseract.slow_width = slow_width
+
+    with pytest.raises(OcrLimitException):
+        ocr.image_to_text(pdf_image, budget)
+    assert budget.limits_hit == {limit: 1}
+
+
+def test_exhausted_document_budget(fake_tesseract: FakeTesseract, pdf_image: PdfImage) -> None:
+    budget = ocr.OcrBudget(document_timeout=1, spent=1)
+
+    assert [words(image_data) for image_data in ocr.images_to_text([pdf_image, pdf_image], budget)] == [[], []]
+    assert fake_tesseract.calls == []
+    assert budget.limits_hit == {"document_timeout": 1}
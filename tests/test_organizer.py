@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import pytest
+
+from pdf_worksheet_organizer import organizer
+from pdf_worksheet_organizer.exceptions import PageSelectionException
+from tests.conftest import FakeTesseract, worksheet
+
+
+@pytest.mark.parametrize(
+    ("pages", "page_numbers"),
+    [
+        (None, [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]),
+        ("1", [0]),
+        ("3-5", [2, 3, 4]),
+        ("8-", [7, 8, 9]),
+        ("-2", [0, 1]),
+        ("10, 1-2, 2", [0, 1, 9]),
+        # sequences are numbered from 1 as well, and put in document order
+        ([3, 1], [0, 2]),
+        ((10,), [9]),
+    ],
+)
+def test_select_pages(pages: organizer.PageSelection | None, page_numbers: list[int]) -> None:
+    assert organizer.select_pages(pages, 10) == page_numbers
+
+
+@pytest.mark.parametrize("pages", ["", "0", "11", "5-3", "a-b", "1,,2", "9-11", [0], [11], []])
+def test_invalid_page_selection(pages: organizer.PageSelection) -> None:
+    with pytest.raises(PageSelectionException):
+        organizer.select_pages(pages, 10)
+
+
+def test_string_and_sequence_select_the_same_pages(fake_tesseract: FakeTesseract) -> None:
+    pdf_bytes = worksheet([["1. first"], ["2. second"], ["3. third"]])
+
+    by_range, range_count = organizer.reorganize(pdf_bytes, add_legend=False, pages="2-3", start_number=5)
+    by_sequence, sequence_count = organizer.reorganize(pdf_bytes, add_legend=False, pages=[2, 3], start_number=5)
+
+    assert range_count == sequence_count == 2
+    for mu_pdf in (by_range, by_sequence):
+        assert [mu_pdf.load_page(page_num).get_text().strip() for page_num in range(3)] == [
+            "1. first",
+            "5) second",
+            "6) third",
+        ]
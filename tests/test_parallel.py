@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import pickle
+import pathlib
+import concurrent.futures
+
+import pytest
+
+from pdf_worksheet_organizer import digits, organizer, parallel, questions
+from pdf_worksheet_organizer.ocr import OcrBudget
+from pdf_worksheet_organizer.exceptions import MissingDependencyException, OcrLimitException
+from pdf_worksheet_organizer.datatypes import PdfNumberedFile, PdfNumberedImage
+from tests.conftest import FakeTesseract, worksheet
+
+
+def describe(numbered_pdf_file: PdfNumberedFile) -> list[list[tuple[object, ...]]]:
+    # what renumbering needs from each element -- streams and regex matches don't compare across documents
+    pages: list[list[tuple[object, ...]]] = []
+
+    for page in numbered_pdf_file.pages:
+        elements: list[tuple[object, ...]] = []
+        for element in page.elements:
+            if isinstance(element, PdfNumberedImage):
+                elements.append(("image", element.id, element.xref, element.number, tuple(element.number_bounding_box)))
+            else:
+                elements.append(("text", element.text, element.number, tuple(element.bounding_box)))
+        pages.append(elements)
+
+    return pages
+
+
+@pytest.mark.parametrize(
+    ("page_count", "chunks"),
+    [(10, 3), (3, 3), (8, 1), (7, 2)],
+)
+def test_split_page_ranges(page_count: int, chunks: int) -> None:
+    page_ranges = parallel.split_page_ranges(page_count, chunks)
+
+    assert len(page_ranges) == chunks
+    assert [page_num for page_range in page_ranges for page_num in page_range] == list(range(page_count))
+    sizes = [len(page_range) for page_range in page_ranges]
+    assert max(sizes) - min(sizes) <= 1
+
+
+@pytest.mark.parametrize("batch_ocr", [False, True])
+def test_parallel_parse_matches_serial(
+    fake_tesseract: FakeTesseract, tmp_path: pathlib.Path, batch_ocr: bool
+) -> None:
+    pdf_bytes = worksheet(
+        [[3, "4. text question", 5], ["6. text question", 7], [8, 9], ["10. text question"]], shared_image=1
+    )
+    pike_pdf, mu_pdf, page_numbers = organizer.open_pdf(pdf_bytes)
+
+    pdf_file = organizer.parse_pdf(pike_pdf, mu_pdf, page_numbers)
+    serial = questions.parse_numbered_pdf(pdf_file, batch_ocr)
+
+    # what the workers do, minus the processes -- each gets a range of the pages and its own copy of the document
+    pdf_path = tmp_path / "source.pdf"
+    mu_pdf.save(pdf_path)
+    parsed_pages = []
+    for page_range in parallel.split_page_ranges(len(page_numbers), 2):
+        chunk = page_numbers[page_range.start : page_range.stop]
+        worker_parsed_pages, _ = parallel.parse_page_range(str(pdf_path), chunk, batch_ocr)
+        parsed_pages.extend(worker_parsed_pages)
+
+    merged_pdf_file, merged = parallel.merge_parsed_pages(pike_pdf, mu_pdf, parsed_pages, page_numbers)
+
+    assert describe(merged) == describe(serial)
+    assert merged.questions_count == serial.questions_count == 12
+    # the parent's own streams are re-attached, not the workers'
+    for page, merged_page in zip(pdf_file.pages, merged_pdf_file.pages):
+        assert [image.stream.objgen for image in merged_page.images] == [image.stream.objgen for image in page.images]
+
+
+def raise_missing_dependency() -> None:
+    raise MissingDependencyException("numpy", "the digit recognizer")
+
+
+def test_worker_exception_reaches_the_caller() -> None:
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+        with pytest.raises(MissingDependencyException) as exc_info:
+            executor.submit(raise_missing_dependency).result()
+
+    assert str(exc_info.value) == "numpy is required for the digit recognizer (pip install numpy)"
+    assert str(pickle.loads(pickle.dumps(exc_info.value))) == str(exc_info.value)
+
+
+def test_missing_numpy_is_caught_before_the_workers_start(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(digits, "np", None)
+
+    def no_pool(*args: object, **kwargs: object) -> None:
+        raise AssertionError("workers were started")
+
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", no_pool)
+    pike_pdf, mu_pdf, page_numbers = organizer.open_pdf(worksheet([["1. question"]] * 8))
+
+    with pytest.raises(MissingDependencyException, match="numpy"):
+        parallel.parse_numbered_pdf(pike_pdf, mu_pdf, page_numbers, workers=2, digit_recognizer=True)
+
+
+def test_ocr_limit_in_a_worker(fake_tesseract: FakeTesseract) -> None:
+    fake_tesseract.slow_width = 0
+    pdf_bytes = worksheet([[3]] * 8)
+    budget = OcrBudget(image_timeout=1, policy="fail")
+
+    # forked workers keep the fake tesseract
+    with pytest.raises(OcrLimitException) as exc_info:
+        organizer.reorganize(pdf_bytes, add_legend=False, workers=2, ocr_budget=budget)
+
+    assert str(exc_info.value) == "OCR limit hit: image_timeout"
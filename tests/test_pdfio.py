@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import io
+import pathlib
+
+import pytest
+import pikepdf
+import fitz as pymupdf
+
+from pdf_worksheet_organizer import organizer, pdfio
+from tests.conftest import FakeTesseract, worksheet
+
+
+@pytest.fixture
+def final_pdf(fake_tesseract: FakeTesseract) -> pymupdf.Document:
+    pdf_bytes = worksheet([["3. first question", 5], ["7. second question", 9]], shared_image=1)
+    final_pdf, _ = organizer.reorganize(pdf_bytes, add_legend=False)
+    return final_pdf
+
+
+def assert_valid_pdf(pdf_bytes: bytes) -> None:
+    with pymupdf.Document(stream=pdf_bytes) as mu_pdf:
+        assert mu_pdf.page_count == 2
+        assert not mu_pdf.is_repaired
+        assert "2) first question" in mu_pdf.load_page(0).get_text()
+        assert "5) second question" in mu_pdf.load_page(1).get_text()
+
+    # qpdf is a lot stricter than mupdf about the file's structure
+    with pikepdf.open(io.BytesIO(pdf_bytes)) as pike_pdf:
+        assert pike_pdf.check_pdf_syntax() == []
+
+
+@pytest.mark.parametrize("profile", list(pdfio.SAVE_PROFILES))
+def test_save_profile_to_bytes(final_pdf: pymupdf.Document, profile: str) -> None:
+    pdf_bytes = pdfio.save_pdf(final_pdf, profile=profile)
+
+    assert pdf_bytes is not None
+    assert_valid_pdf(pdf_bytes)
+
+
+@pytest.mark.parametrize("profile", list(pdfio.SAVE_PROFILES))
+def test_save_profile_to_path(final_pdf: pymupdf.Document, profile: str, tmp_path: pathlib.Path) -> None:
+    output_path = tmp_path / "output.pdf"
+
+    assert pdfio.save_pdf(final_pdf, output_path, profile=profile) is None
+    assert_valid_pdf(output_path.read_bytes())
+
+
+def test_save_to_stream(final_pdf: pymupdf.Document) -> None:
+    output = io.BytesIO()
+
+    assert pdfio.save_pdf(final_pdf, output) is None
+    assert_valid_pdf(output.getvalue())
+
+
+class ReadOnlyStream:
+    # a stream without a file descriptor behind it, e.g. an upload or a socket
+    def __init__(self, data: bytes) -> None:
+        self.bytes_io = io.BytesIO(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.bytes_io.read(size)
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+@pytest.mark.parametrize(
+    "source_kind", ["path", "str", "bytes", "bytearray", "memoryview", "bytes_io", "file", "stream"]
+)
+def test_open_source(
+    source_kind: str, mmap: bool, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    if mmap:
+        monkeypatch.setattr(pdfio, "MMAP_THRESHOLD", 0)
+
+    pdf_bytes = worksheet([["1. first"], ["2. second"]])
+    pdf_path = tmp_path / "source.pdf"
+    pdf_path.write_bytes(pdf_bytes)
+
+    with open(pdf_path, "rb") as file:
+        source: pdfio.PdfSource = {
+            "path": pdf_path,
+            "str": str(pdf_path),
+            "bytes": pdf_bytes,
+            "bytearray": bytearray(pdf_bytes),
+            "memoryview": memoryview(pdf_bytes),
+            "bytes_io": io.BytesIO(pdf_bytes),
+            "file": file,
+            "stream": ReadOnlyStream(pdf_bytes),  # type: ignore
+        }[source_kind]
+
+        with pdfio.open_source(source) as mu_pdf:
+            assert mu_pdf.page_count == 2
+            assert [mu_pdf.load_page(page_num).get_text().strip() for page_num in range(2)] == ["1. first", "2. second"]
+
+
+def test_bytes_io_source_can_be_reused(fake_tesseract: FakeTesseract) -> None:
+    pdf_bytes_io = io.BytesIO(worksheet([["3. first"]]))
+
+    # text only, so the opened document is the one handed back
+    final_pdf, _ = organizer.reorganize(pdf_bytes_io, add_legend=False)
+
+    pdf_bytes_io.seek(0)
+    pdf_bytes_io.truncate()
+    pdfio.save_pdf(final_pdf, pdf_bytes_io)
+
+    with pymupdf.Document(stream=pdf_bytes_io.getvalue()) as mu_pdf:
+        assert "1) first" in mu_pdf.load_page(0).get_text()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import io
+import typing as t
+
+import pytest
+import fitz as pymupdf
+
+from pdf_worksheet_organizer import organizer, questionmap
+from pdf_worksheet_organizer.exceptions import InvalidQuestionMapException, QuestionMapException
+from tests.conftest import FakeTesseract, worksheet
+
+
+def page_pixels(mu_pdf: pymupdf.Document) -> list[bytes]:
+    return [mu_pdf.load_page(page_num).get_pixmap(dpi=36).samples for page_num in range(mu_pdf.page_count)]
+
+
+@pytest.fixture
+def pdf_bytes() -> bytes:
+    return worksheet([[3, "4. text question", 5], ["6. text question", 7]], shared_image=1)
+
+
+def test_question_map_roundtrip(fake_tesseract: FakeTesseract, pdf_bytes: bytes) -> None:
+    question_map = organizer.detect_questions(pdf_bytes)
+
+    file = io.StringIO()
+    questionmap.dump_question_map(question_map, file)
+    file.seek(0)
+    loaded_question_map = questionmap.load_question_map(file)
+
+    ocr_calls = len(fake_tesseract.calls)
+    mapped_pdf, mapped_count = organizer.reorganize_with_question_map(pdf_bytes, loaded_question_map, False)
+    # applying a map doesn't ocr anything
+    assert len(fake_tesseract.calls) == ocr_calls
+
+    final_pdf, questions_count = organizer.reorganize(pdf_bytes, add_legend=False)
+    assert mapped_count == questions_count == question_map["questions_count"] == 7
+    assert page_pixels(mapped_pdf) == page_pixels(final_pdf)
+
+
+def test_question_map_elements(fake_tesseract: FakeTesseract, pdf_bytes: bytes) -> None:
+    question_map = organizer.detect_questions(pdf_bytes)
+
+    elements = [element for map_page in question_map["pages"] for element in map_page["elements"]]
+    assert [(element["type"], element["original_number"], element["new_number"]) for element in elements] == [
+        ("image", 1, 1),
+        ("image", 3, 2),
+        ("text", 4, 3),
+        ("image", 5, 4),
+        ("image", 1, 5),
+        ("text", 6, 6),
+        ("image", 7, 7),
+    ]
+
+
+def test_dropped_element_is_left_alone(fake_tesseract: FakeTesseract, pdf_bytes: bytes) -> None:
+    question_map = organizer.detect_questions(pdf_bytes)
+    # the text question on the first page
+    del question_map["pages"][0]["elements"][2]
+
+    final_pdf, questions_count = organizer.reorganize_with_question_map(pdf_bytes, question_map, False)
+
+    assert questions_count == 6
+    assert "4. text question" in final_pdf.load_page(0).get_text()
+    assert "5) text question" in final_pdf.load_page(1).get_text()
+
+
+def test_unsupported_version(fake_tesseract: FakeTesseract, pdf_bytes: bytes) -> None:
+    question_map = organizer.detect_questions(pdf_bytes)
+    question_map["version"] = questionmap.QUESTION_MAP_VERSION + 1
+
+    with pytest.raises(InvalidQuestionMapException) as exc_info:
+        organizer.reorganize_with_question_map(pdf_bytes, question_map, False)
+    # it's the map that's wrong, not any one page
+    assert str(exc_info.value) == f"Invalid question map: unsupported version {questionmap.QUESTION_MAP_VERSION + 1}"
+
+
+@pytest.mark.parametrize(
+    ("edit", "reason"),
+    [
+        (lambda question_map: question_map.pop("pages"), "pages should be a list, not None"),
+        (lambda question_map: question_map.pop("start_number"), "start_number should be an integer, not None"),
+        (
+            lambda question_map: question_map["pages"][0].update(page="1"),
+            "pages[0].page should be an integer, not '1'",
+        ),
+        (
+            lambda question_map: question_map["pages"][1]["elements"][0].pop("image_id"),
+            "pages[1].elements[0].image_id should be an integer, not None",
+        ),
+        (
+            lambda question_map: question_map["pages"][0]["elements"][0].update(bounding_box=[1, 2]),
+            "pages[0].elements[0].bounding_box should be [x0, y0, x1, y1], not [1, 2]",
+        ),
+        (
+            lambda question_map: question_map["pages"][0]["elements"][0].update(type="table"),
+            "pages[0].elements[0].type is 'table', not 'text' or 'image'",
+        ),
+    ],
+)
+def test_malformed_map(
+    fake_tesseract: FakeTesseract, pdf_bytes: bytes, edit: t.Callable[[t.Any], object], reason: str
+) -> None:
+    question_map = organizer.detect_questions(pdf_bytes)
+    edit(question_map)
+
+    file = io.StringIO()
+    questionmap.dump_question_map(question_map, file)
+    file.seek(0)
+
+    with pytest.raises(InvalidQuestionMapException) as exc_info:
+        questionmap.load_question_map(file)
+    assert str(exc_info.value) == f"Invalid question map: {reason}"
+
+
+def test_map_that_isnt_json() -> None:
+    with pytest.raises(InvalidQuestionMapException, match="not json"):
+        questionmap.load_question_map(io.StringIO("{"))
+
+
+def test_map_of_another_document(fake_tesseract: FakeTesseract, pdf_bytes: bytes) -> None:
+    question_map = organizer.detect_questions(pdf_bytes)
+    question_map["pages"][1]["elements"][0]["image_id"] = 9
+
+    with pytest.raises(QuestionMapException, match="no image with id 9"):
+        organizer.reorganize_with_question_map(pdf_bytes, question_map, False)
+
+
+def test_pages_are_numbered_from_one(fake_tesseract: FakeTesseract, pdf_bytes: bytes) -> None:
+    question_map = organizer.detect_questions(pdf_bytes, pages="2", start_number=10)
+
+    assert [map_page["page"] for map_page in question_map["pages"]] == [2]
+    assert question_map["start_number"] == 10
+
+    final_pdf, questions_count = organizer.reorganize_with_question_map(pdf_bytes, question_map, False)
+    assert questions_count == 3
+    assert "11) text question" in final_pdf.load_page(1).get_text()
+
+
+def test_version_1_map(fake_tesseract: FakeTesseract, pdf_bytes: bytes) -> None:
+    question_map = organizer.detect_questions(pdf_bytes, pages="2")
+    final_pdf, _ = organizer.reorganize_with_question_map(pdf_bytes, question_map, False)
+
+    # written before pages were numbered from 1, and before start numbers
+    question_map["version"] = 1
+    for map_page in question_map["pages"]:
+        map_page["page"] -= 1
+    del question_map["start_number"]  # type: ignore
+
+    version_1_pdf, questions_count = organizer.reorganize_with_question_map(pdf_bytes, question_map, False)
+
+    assert questions_count == 3
+    assert page_pixels(version_1_pdf) == page_pixels(final_pdf)
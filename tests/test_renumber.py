@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import io
+import pathlib
+
+import pytest
+import pikepdf
+import fitz as pymupdf
+from PIL import Image, ImageOps
+
+from pdf_worksheet_organizer import organizer, renumber
+from tests.conftest import FakeTesseract, image_bytes, numbered_image, worksheet
+
+FONT_PATH = pathlib.Path(__file__).parent.parent / "assets" / "JetBrainsMono-Bold.ttf"
+
+
+def test_image_numbers_are_drawn_with_whole_fonts(fake_tesseract: FakeTesseract) -> None:
+    # the document's only embedded font doesn't have any digits in its text, so subsetting it
+    # before the images are drawn would leave them without glyphs for the new number
+    mu_pdf = pymupdf.Document()
+    mu_page: pymupdf.Page = mu_pdf.new_page()
+    mu_page.insert_text((72, 72), "Name", fontname="JetBrainsMono", fontfile=str(FONT_PATH))
+    mu_page.insert_text((72, 120), "1. Add", fontsize=12)
+    mu_page.insert_image(pymupdf.Rect(72, 200, 272, 260), stream=image_bytes(numbered_image(5)))
+
+    pike_pdf, mu_pdf, page_numbers = organizer.open_pdf(mu_pdf.tobytes())
+    pdf_file, numbered_pdf_file = organizer.detect_numbered_pdf(pike_pdf, mu_pdf, page_numbers)
+    fonts = organizer.parse_pdf_fonts(mu_pdf)
+
+    final_pdf = renumber.renumber_pdf(pike_pdf, mu_pdf, pdf_file, numbered_pdf_file, fonts)
+
+    used_fonts = [font for font in fonts.values() if "buffer" in vars(font) and font.buffer]
+    assert [font.name for font in used_fonts] == ["JetBrains Mono Bold"]
+    assert all(used_fonts[0].as_pymupdf_font().has_glyph(ord(character)) for character in "0123456789)")
+    assert "1) Add" in final_pdf.load_page(0).get_text()
+
+
+def placement_pixels(mu_pdf: pymupdf.Document, page_num: int) -> list[bytes]:
+    mu_page: pymupdf.Page = mu_pdf.load_page(page_num)
+    return [mu_page.get_pixmap(clip=info["bbox"]).samples for info in mu_page.get_image_info()]
+
+
+def test_shared_image_is_copied_per_page(fake_tesseract: FakeTesseract) -> None:
+    pdf_bytes = worksheet([[3], [5], [7]], shared_image=1)
+
+    final_pdf, questions_count = organizer.reorganize(pdf_bytes, add_legend=False, pages="1-2")
+
+    assert questions_count == 4
+    first, second, third = (placement_pixels(final_pdf, page_num) for page_num in range(3))
+    # renumbered as 1 and 3 on the selected pages
+    assert first[0] != second[0]
+    # left alone on the page that wasn't selected
+    with pymupdf.Document(stream=pdf_bytes) as mu_pdf:
+        assert third == placement_pixels(mu_pdf, 2)
+
+
+@pytest.mark.parametrize("same_name", [False, True])
+def test_image_placed_twice_on_a_page(fake_tesseract: FakeTesseract, same_name: bool) -> None:
+    mu_pdf = pymupdf.Document()
+    for _ in range(2):
+        mu_page: pymupdf.Page = mu_pdf.new_page()
+        xref = mu_page.insert_image(pymupdf.Rect(72, 100, 272, 160), stream=image_bytes(numbered_image(5)))
+        mu_page.insert_image(pymupdf.Rect(72, 300, 272, 360), xref=xref)
+
+    pike_pdf = pikepdf.open(io.BytesIO(mu_pdf.tobytes()))
+    if same_name:
+        # pymupdf gives every placement its own name, other writers draw the same name twice
+        for pike_page in pike_pdf.pages:
+            instructions = pikepdf.parse_content_stream(pike_page)
+            first_name = next(operands[0] for operands, operator in instructions if operator == pikepdf.Operator("Do"))
+            instructions = [
+                pikepdf.ContentStreamInstruction([first_name], instruction.operator)
+                if instruction.operator == pikepdf.Operator("Do")
+                else instruction
+                for instruction in instructions
+            ]
+            pike_page.obj.Contents = pike_pdf.make_stream(pikepdf.unparse_content_stream(instructions))
+    pdf_bytes_io = io.BytesIO()
+    pike_pdf.save(pdf_bytes_io)
+
+    final_pdf, questions_count = organizer.reorganize(pdf_bytes_io.getvalue(), add_legend=False)
+
+    assert questions_count == 4
+    pixels = [pixels for page_num in range(2) for pixels in placement_pixels(final_pdf, page_num)]
+    # 1 through 4, all different
+    assert len(set(pixels)) == 4
+
+
+@pytest.mark.parametrize("pages", ["1-2", "1"])
+def test_shared_image_in_a_form(fake_tesseract: FakeTesseract, pages: str) -> None:
+    # the same form xobject, drawing the same image, on every page
+    form_pdf = pymupdf.Document()
+    form_pdf.new_page().insert_image(pymupdf.Rect(72, 100, 272, 160), stream=image_bytes(numbered_image(5)))
+
+    mu_pdf = pymupdf.Document()
+    for _ in range(3):
+        mu_page: pymupdf.Page = mu_pdf.new_page()
+        mu_page.show_pdf_page(mu_page.rect, form_pdf, 0)
+    pdf_bytes = mu_pdf.tobytes()
+
+    final_pdf, questions_count = organizer.reorganize(pdf_bytes, add_legend=False, pages=pages, start_number=7)
+
+    assert questions_count == len(pages.split("-"))
+    first, second, third = (placement_pixels(final_pdf, page_num) for page_num in range(3))
+    with pymupdf.Document(stream=pdf_bytes) as mu_pdf:
+        original = placement_pixels(mu_pdf, 0)
+    assert first != original
+    # renumbered separately if it was selected, otherwise it still draws the original form -- as does page 3
+    assert second != first and (second != original) == (pages == "1-2")
+    assert third == original
+
+
+def test_inverted_jpeg(fake_tesseract: FakeTesseract) -> None:
+    # stored inverted, and inverted back by its /Decode array
+    jpeg_bytes_io = io.BytesIO()
+    ImageOps.invert(numbered_image(3)).save(jpeg_bytes_io, format="jpeg")
+
+    mu_pdf = pymupdf.Document()
+    mu_page: pymupdf.Page = mu_pdf.new_page()
+    mu_page.insert_image(pymupdf.Rect(72, 120, 272, 180), stream=jpeg_bytes_io.getvalue())
+
+    pike_pdf = pikepdf.open(io.BytesIO(mu_pdf.tobytes()))
+    image = next(iter(pike_pdf.pages[0].images.values()))
+    image.Decode = pikepdf.Array([1, 0, 1, 0, 1, 0])
+    pdf_bytes_io = io.BytesIO()
+    pike_pdf.save(pdf_bytes_io)
+
+    final_pdf, questions_count = organizer.reorganize(pdf_bytes_io.getvalue(), add_legend=False, start_number=8)
+
+    assert questions_count == 1
+    pixmap = final_pdf.load_page(0).get_pixmap(clip=(72, 120, 272, 180))
+    pil_image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    # still white, with the new number drawn in black where the old one was
+    assert min(pil_image.getpixel((pixmap.width - 1, pixmap.height - 1))) > 200
+    assert pil_image.convert("L").crop((0, 0, pixmap.width // 2, pixmap.height)).getextrema()[0] < 64
+
+
+@pytest.mark.parametrize("mode", ["1", "L", "RGB"])
+def test_image_modes(fake_tesseract: FakeTesseract, mode: str) -> None:
+    mu_pdf = pymupdf.Document()
+    mu_page: pymupdf.Page = mu_pdf.new_page()
+    mu_page.insert_image(pymupdf.Rect(72, 120, 272, 180), stream=image_bytes(numbered_image(3).convert(mode)))
+    pdf_bytes = mu_pdf.tobytes()
+
+    final_pdf, questions_count = organizer.reorganize(pdf_bytes, add_legend=False, start_number=8)
+
+    assert questions_count == 1
+    with pymupdf.Document(stream=pdf_bytes) as mu_pdf:
+        original = placement_pixels(mu_pdf, 0)
+    assert placement_pixels(final_pdf, 0) != original
+    # written back in its own color space
+    [mu_image] = final_pdf.load_page(0).get_images()
+    assert pymupdf.Pixmap(final_pdf, mu_image[0]).n == (3 if mode == "RGB" else 1)